@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""batchjobs.py
+
+Udacity conference server-side Python App Engine resumable, cursor
+chunked batch jobs over all entities of a kind (backfills & aggregates)
+
+"""
+
+import logging
+from datetime import datetime
+
+from google.appengine.datastore.datastore_query import Cursor
+from google.appengine.ext import ndb
+
+from conference import ConferenceApi
+from conference import SESSION_DEFAULTS
+from conference import TOP_SPEAKERS_CACHE
+from models import BatchJob
+from models import Conference
+from models import Profile
+from models import Session
+from utils import TaskBatch
+
+JOB_CHUNK_SIZE = 100
+
+# Each job walks every entity of a kind in cursor bounded chunks, one
+# chained task per chunk. The job function gets the chunk's entities and
+# returns how many it updated. The entities are a snapshot from the query,
+# so only use them to pick what to update: re-read & write each entity in
+# its own transaction, or a write committed meanwhile (a registration, a
+# new session) would be overwritten. Job functions must be idempotent, so
+# a job can be re-run at any time.
+
+@ndb.transactional()
+def _addToSessionList(conf_key, wssks):
+    """Add the missing wssks to a Conference's sessionList (bumping its version)
+    and mark the list complete."""
+    conf = conf_key.get()
+    missing = [wssk for wssk in wssks if wssk not in conf.sessionList]
+    if not missing and conf.sessionListComplete:
+        return False
+    if missing:
+        conf.sessionList.extend(missing)
+        conf.version = (conf.version or 0) + 1
+    conf.sessionListComplete = True
+    conf.put()
+    return True
+
+
+def _fillSessionList(confs):
+    """Add the sessions pointing at each Conference to its sessionList."""
+    confs = [conf for conf in confs if not conf.sessionListComplete]
+    futures = [Session.query(Session.webSafeConfId == conf.key.urlsafe()).fetch_async(keys_only=True)
+               for conf in confs]
+    updated = 0
+    for conf, future in zip(confs, futures):
+        missing = [key.urlsafe() for key in future.get_result()
+                   if key.urlsafe() not in conf.sessionList]
+        if _addToSessionList(conf.key, missing):
+            updated += 1
+    return updated
+
+
+@ndb.transactional()
+def _setMonth(conf_key):
+    """Set Conference.month from startDate (0 if there is none), bumping its version."""
+    conf = conf_key.get()
+    month = conf.startDate.month if conf.startDate else 0
+    if conf.month == month:
+        return False
+    conf.month = month
+    conf.version = (conf.version or 0) + 1
+    conf.put()
+    return True
+
+
+def _recomputeMonth(confs):
+    """Set Conference.month from startDate where it is out of date."""
+    return len([conf for conf in confs
+                if conf.month != (conf.startDate.month if conf.startDate else 0)
+                and _setMonth(conf.key)])
+
+
+def _linkSpeakers(sessions):
+    """Link Sessions to their Speaker; each session is updated in its own
+    transaction together with the Speaker counts."""
+    linked = len([sesn for sesn in sessions
+                  if not sesn.speakerKey and sesn.speaker not in (None, SESSION_DEFAULTS['speaker'])
+                  and ConferenceApi._linkSpeaker(sesn.key)])
+    if linked:
+        TOP_SPEAKERS_CACHE.invalidate()
+    return linked
+
+
+def _reconcileStats(confs):
+    """Recompute each Conference's ConferenceStats, each in its own transaction."""
+    drifted = [conf.key.id() for conf in confs if ConferenceApi._reconcileStats(conf)]
+    if drifted:
+        logging.warning('reconciled drifted stats of conferences %s', drifted)
+    return len(drifted)
+
+
+def _indexWishlists(profiles):
+    """Build the wishlist schedule index of Profiles from before it existed;
+    each is stored in its own transaction."""
+    stale = [prof for prof in profiles if prof.wishlistSchedule is None]
+    for prof in stale:
+        ConferenceApi._ensureWishlistSchedule(prof.key)
+    return len(stale)
+
+
+JOBS = {
+    'conference_session_list': (Conference, _fillSessionList),
+    'conference_month': (Conference, _recomputeMonth),
+    'session_speakers': (Session, _linkSpeakers),
+    'conference_stats': (Conference, _reconcileStats),
+    'profile_wishlist_schedule': (Profile, _indexWishlists),
+}
+
+
+def jobStatus(job):
+    """Return the progress of a BatchJob as a dict."""
+    elapsed = ((job.modified or datetime.now()) - job.started).total_seconds()
+    return {
+        'id': job.key.id(),
+        'name': job.name,
+        'done': job.done,
+        'chunks': job.chunks,
+        'processed': job.processed,
+        'updated': job.updated,
+        'seconds': round(elapsed, 1),
+        'perSecond': round(job.processed / elapsed, 1) if elapsed else None,
+    }
+
+
+def startJob(name):
+    """Create a BatchJob and enqueue its first chunk."""
+    job = BatchJob(name=name)
+    job.put()
+    enqueueJobChunk(job.key.id(), 0)
+    return job
+
+
+def enqueueJobChunk(job_id, chunk):
+    """Enqueue the task for a job chunk, transactionally if in a transaction."""
+    tasks = TaskBatch()
+    tasks.add('/tasks/run_batch_job', {'job': job_id, 'chunk': chunk})
+    tasks.flush()
+
+
+@ndb.transactional()
+def _checkpointJob(job_id, chunk, cursor, processed, updated):
+    """Record a finished chunk and chain the task for the next one."""
+    job = BatchJob.get_by_id(job_id)
+    if job.chunks != chunk:
+        return
+    job.cursor = cursor
+    job.chunks += 1
+    job.processed += processed
+    job.updated += updated
+    job.done = cursor is None
+    job.put()
+    if not job.done:
+        enqueueJobChunk(job_id, job.chunks)
+    logging.info('batch job %s', jobStatus(job))
+
+
+def runJobChunk(job_id, chunk):
+    """Process one chunk of a job; stale or repeated tasks are ignored."""
+    job = BatchJob.get_by_id(job_id)
+    if not job or job.done or job.chunks != chunk:
+        return
+    kind, fn = JOBS[job.name]
+    cursor = Cursor(urlsafe=job.cursor) if job.cursor else None
+    entities, next_cursor, more = kind.query().fetch_page(JOB_CHUNK_SIZE, start_cursor=cursor)
+    updated = fn(entities)
+    _checkpointJob(job_id, chunk, next_cursor.urlsafe() if more and next_cursor else None,
+                   len(entities), updated)
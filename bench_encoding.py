@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""bench_encoding.py
+
+Compare encode time and response size of the columns encoding in
+encoding.py against the default ProtoRPC JSON for ConferenceForms and
+SessionForms, plain and gzipped (as the frontend sends them). Sizes are
+of the whole JSON response. Run with the App Engine SDK on the
+PYTHONPATH:
+
+    python bench_encoding.py [number of items]
+
+"""
+
+from __future__ import unicode_literals
+
+import sys
+import timeit
+
+from protorpc import protojson
+
+import zlib
+
+from encoding import encodeForms
+from models import ConferenceForm, ConferenceForms, SessionForm, SessionForms
+
+# a typical urlsafe key, long enough to dominate the payload like the real ones
+WEBSAFE_KEY = 'ahdzfnVkYWNpdHktcDQtY2hhZGRpZW5oYXJ0ckMLEgdQcm9maWxlIhhjaGFkZGllbmhhcnRAZ21haWwuY29tDAsSCkNvbmZlcmVuY2UYgICAgICAgAoM'
+
+
+def conferenceForms(n):
+    return ConferenceForms(items=[ConferenceForm(
+        name='Conference %d' % i,
+        description='A conference about things, number %d' % i,
+        organizerUserId='organizer%d@example.com' % (i % 50),
+        topics=['Web Technologies', 'Programming Languages'],
+        city='London',
+        startDate='2015-%02d-01' % (i % 12 + 1),
+        month=i % 12 + 1,
+        maxAttendees=100,
+        seatsAvailable=i % 100,
+        endDate='2015-%02d-03' % (i % 12 + 1),
+        websafeKey=WEBSAFE_KEY + str(i),
+        etag='"%d-1"' % i,
+    ) for i in range(n)])
+
+
+def sessionForms(n):
+    return SessionForms(items=[SessionForm(
+        name='Session %d' % i,
+        highlights=['tbd'],
+        speaker='Speaker %d' % (i % 20),
+        durationHours=1.0,
+        type='lecture',
+        date='2015-06-%02d' % (i % 28 + 1),
+        startTime=9.0 + i % 8,
+        webSafeConfId=WEBSAFE_KEY,
+        websafeSessionKey=WEBSAFE_KEY + str(i),
+    ) for i in range(n)])
+
+
+def columns(forms):
+    return protojson.encode_message(type(forms)(payload=encodeForms(forms, 'columns'), encoding='columns'))
+
+
+def bench(label, forms, repeat=20):
+    encoders = [
+        ('protojson', lambda: protojson.encode_message(forms)),
+        ('protojson, gzip', lambda: zlib.compress(protojson.encode_message(forms), 6)),
+        ('columns', lambda: columns(forms)),
+        ('columns, gzip', lambda: zlib.compress(columns(forms), 6)),
+    ]
+
+    print '%s (%d items)' % (label, len(forms.items))
+    print '  %-16s %10s %10s' % ('encoding', 'wire bytes', 'ms')
+    for name, encode in encoders:
+        size = len(encode())
+        ms = min(timeit.repeat(encode, number=1, repeat=repeat)) * 1000
+        print '  %-16s %10d %10.2f' % (name, size, ms)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    bench('ConferenceForms', conferenceForms(n))
+    bench('SessionForms', sessionForms(n))
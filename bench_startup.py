@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+
+"""bench_startup.py
+
+Measure the import time of the app's modules, each in a fresh
+interpreter as on a new instance. Run with the App Engine SDK on the
+PYTHONPATH:
+
+    python bench_startup.py [repeats]
+
+"""
+
+import subprocess
+import sys
+
+MODULES = ('main', 'batchjobs', 'conference')
+
+TIMER = 'import time; t = time.time(); import %s; print time.time() - t'
+
+
+def importTime(module):
+    """Return the seconds it takes to import module in a new interpreter."""
+    return float(subprocess.check_output([sys.executable, '-c', TIMER % module]))
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print '%-12s %10s %10s' % ('module', 'min ms', 'median ms')
+    for module in MODULES:
+        times = sorted(importTime(module) for _ in range(repeats))
+        print '%-12s %10.1f %10.1f' % (module, times[0] * 1000, times[len(times) // 2] * 1000)
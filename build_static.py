@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""build_static.py
+
+Build the web client's static assets for deployment: concatenate and
+minify the CSS and the JS, inline the Angular partials into the
+$templateCache, write the bundles to static/dist under content hashed
+names and point templates/index.html at them. Run before appcfg.py
+update:
+
+    python build_static.py          # bundled, for deployment
+    python build_static.py --dev    # the unbundled sources, for development
+
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(ROOT, 'static', 'dist')
+DIST_URL = '/dist'
+INDEX = os.path.join(ROOT, 'templates', 'index.html')
+
+# (file, url) in load order; bootstrap.css & bootstrap-responsive.css are
+# Bootstrap 2 and unused, the page loads Bootstrap 3 from the CDN
+CSS_SOURCES = [
+    ('static/bootstrap/css/bootstrap-cosmo.css', '/css/bootstrap-cosmo.css'),
+    ('static/bootstrap/css/main.css', '/css/main.css'),
+    ('static/bootstrap/css/offcanvas.css', '/css/offcanvas.css'),
+]
+JS_SOURCES = [
+    ('static/js/app.js', '/js/app.js'),
+    ('static/js/controllers.js', '/js/controllers.js'),
+]
+PARTIALS_DIR = 'static/partials'
+PARTIALS_URL = '/partials'
+
+# index.html lines between these markers are replaced on every build
+BLOCK_RE = r'(<!-- build:%s -->\n)(.*?)(\s*<!-- endbuild -->)'
+
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+# a string, a regular expression after ( , = : [ ! & | ? { } ; or return,
+# a comment, or anything else up to the next of these
+JS_TOKEN_RE = re.compile(r'''
+    ("(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | ((?:^|(?<=[(,=:\[!&|?{};])|(?<=return))\s*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[gimy]*)
+  | (/\*.*?\*/|//[^\n]*)
+''', re.S | re.X)
+
+
+def minifyCss(css):
+    """Drop comments & insignificant whitespace; keeps /*! licence */ comments."""
+    css = CSS_COMMENT_RE.sub(lambda m: m.group(0) if m.group(0).startswith('/*!') else '', css)
+    css = CSS_SPACE_RE.sub(' ', css)
+    css = CSS_PUNCTUATION_RE.sub(r'\1', css)
+    css = re.sub(r'\s*:\s*(?=[^{}]*;)', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minifyJs(js):
+    """Drop comments, indentation & blank lines. Line breaks are kept, so
+    automatic semicolon insertion works as before, and identifiers are not
+    renamed, so Angular's dependency injection by argument name still works."""
+    def keep(m):
+        return '' if m.group(3) else m.group(0)
+    js = JS_TOKEN_RE.sub(keep, js)
+    lines = (line.strip() for line in js.split('\n'))
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def templateCacheJs():
+    """Return a run block putting every partial into the $templateCache,
+    under the URL the routes & modals ask for."""
+    puts = []
+    for name in sorted(os.listdir(os.path.join(ROOT, PARTIALS_DIR))):
+        if name.endswith('.html'):
+            with open(os.path.join(ROOT, PARTIALS_DIR, name)) as f:
+                html = f.read().decode('utf-8')
+            html = '\n'.join(line.strip() for line in html.split('\n') if line.strip())
+            puts.append('$templateCache.put(%s, %s);' % (
+                json.dumps('%s/%s' % (PARTIALS_URL, name)), json.dumps(html)))
+    return ("app.run(['$templateCache', function ($templateCache) {\n%s\n}]);\n"
+            % '\n'.join(puts))
+
+
+def readSources(sources):
+    contents = []
+    for path, url in sources:
+        with open(os.path.join(ROOT, path)) as f:
+            contents.append(f.read().decode('utf-8'))
+    return contents
+
+
+def writeBundle(name, ext, content):
+    """Write content as static/dist/<name>.<hash>.<ext>, dropping older builds; returns its URL."""
+    content = content.encode('utf-8')
+    filename = '%s.%s.%s' % (name, hashlib.md5(content).hexdigest()[:10], ext)
+    if not os.path.isdir(DIST_DIR):
+        os.makedirs(DIST_DIR)
+    for old in os.listdir(DIST_DIR):
+        if old.startswith(name + '.') and old.endswith('.' + ext) and old != filename:
+            os.remove(os.path.join(DIST_DIR, old))
+    with open(os.path.join(DIST_DIR, filename), 'wb') as f:
+        f.write(content)
+    return '%s/%s' % (DIST_URL, filename), len(content)
+
+
+def rewriteIndex(css_tags, js_tags):
+    """Replace the build:css & build:js blocks of templates/index.html."""
+    with open(INDEX) as f:
+        html = f.read()
+    for block, tags in (('css', css_tags), ('js', js_tags)):
+        html, count = re.subn(BLOCK_RE % block,
+                              lambda m: m.group(1) + '\n'.join(tags) + m.group(3), html, flags=re.S)
+        if count != 1:
+            sys.exit('%s: expected one build:%s block' % (INDEX, block))
+    with open(INDEX, 'w') as f:
+        f.write(html)
+
+
+def cssTag(url):
+    return '    <link rel="stylesheet" href="%s">' % url
+
+
+def jsTag(url):
+    return '<script src="%s"></script>' % url
+
+
+def build():
+    css = readSources(CSS_SOURCES)
+    js = readSources(JS_SOURCES)
+    css_url, css_size = writeBundle('app', 'css', '\n'.join(minifyCss(c) for c in css) + '\n')
+    js_url, js_size = writeBundle('app', 'js', ''.join(minifyJs(j) for j in js) + templateCacheJs())
+    rewriteIndex([cssTag(css_url)], [jsTag(js_url)])
+    print '%s: %d bytes (from %d)' % (css_url, css_size, sum(len(c) for c in css))
+    print '%s: %d bytes (from %d + partials)' % (js_url, js_size, sum(len(j) for j in js))
+
+
+def dev():
+    rewriteIndex([cssTag(url) for path, url in CSS_SOURCES],
+                 [jsTag(url) for path, url in JS_SOURCES])
+    print '%s now loads the unbundled sources' % INDEX
+
+
+if __name__ == '__main__':
+    if '--dev' in sys.argv[1:]:
+        dev()
+    else:
+        build()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""cache.py
+
+Udacity conference server-side Python App Engine two-tier cache: an
+in-instance LRU in front of memcache for small, rarely changing values
+
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from google.appengine.api import memcache
+
+# every TwoTierCache created, for the hit ratio counters
+CACHES = []
+
+
+class LocalCache(object):
+    """Size bounded, TTL aware, thread safe LRU cache of one instance."""
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, value) for a live entry, (False, None) otherwise."""
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is None:
+                return False, None
+            value, expires = entry
+            if expires < time.time():
+                return False, None
+            # re-insert to mark as most recently used
+            self._items[key] = entry
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (value, time.time() + ttl)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class TwoTierCache(object):
+    """Cache values in this instance for local_ttl seconds, and in memcache.
+
+    Memcache keys include a generation number kept in memcache, so
+    invalidate() drops every value of the cache with one incr. delete() &
+    invalidate() only reach memcache & this instance; other instances keep
+    serving their local copies (and generation) for up to local_ttl
+    seconds, so keep it short. local_ttl=0 skips the local tier, for values
+    that must change everywhere at once (e.g. ones an ETag is computed from).
+    """
+
+    def __init__(self, namespace, local_ttl=10, memcache_ttl=0, max_items=1000):
+        self.namespace = namespace
+        self.local_ttl = local_ttl
+        self.memcache_ttl = memcache_ttl
+        self._local = LocalCache(max_items)
+        self._generation = None
+        self._generation_expires = 0
+        self.local_hits = 0
+        self.memcache_hits = 0
+        self.misses = 0
+        CACHES.append(self)
+
+    def _generationKey(self):
+        return 'GENERATION:%s' % self.namespace
+
+    def generation(self):
+        """Return the current generation, re-read from memcache every local_ttl seconds."""
+        if self._generation is None or self._generation_expires <= time.time():
+            generation = memcache.get(self._generationKey())
+            if generation is None:
+                memcache.add(self._generationKey(), 0)
+                generation = 0
+            if generation != self._generation:
+                self._local.clear()
+            self._generation = generation
+            self._generation_expires = time.time() + self.local_ttl
+        return self._generation
+
+    def _memcacheKey(self, key):
+        return '%s:%d:%s' % (self.namespace, self.generation(), key)
+
+    def get(self, key):
+        """Return the cached value of key, or None."""
+        memcache_key = self._memcacheKey(key)
+        if self.local_ttl:
+            found, value = self._local.get(memcache_key)
+            if found:
+                self.local_hits += 1
+                return value
+        value = memcache.get(memcache_key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.memcache_hits += 1
+        if self.local_ttl:
+            self._local.set(memcache_key, value, self.local_ttl)
+        return value
+
+    def set(self, key, value):
+        memcache_key = self._memcacheKey(key)
+        memcache.set(memcache_key, value, time=self.memcache_ttl)
+        if self.local_ttl:
+            self._local.set(memcache_key, value, self.local_ttl)
+
+    def delete(self, key):
+        """Drop key; other instances may serve it for up to local_ttl seconds."""
+        memcache_key = self._memcacheKey(key)
+        memcache.delete(memcache_key)
+        self._local.delete(memcache_key)
+
+    def invalidate(self):
+        """Drop every value of this cache by moving to a new generation."""
+        self._generation = memcache.incr(self._generationKey(), initial_value=0)
+        self._generation_expires = time.time() + self.local_ttl
+        self._local.clear()
+
+    def stats(self):
+        """Return the hit counters of this instance, per tier."""
+        lookups = self.local_hits + self.memcache_hits + self.misses
+        return {
+            'namespace': self.namespace,
+            'localHits': self.local_hits,
+            'memcacheHits': self.memcache_hits,
+            'misses': self.misses,
+            'localHitRatio': float(self.local_hits) / lookups if lookups else None,
+            'hitRatio': float(self.local_hits + self.memcache_hits) / lookups if lookups else None,
+        }
@@ -15,12 +15,17 @@ __author__ = 'wesc+api@google.com (Wesley Chun)'
 
 from datetime import datetime
 
+import hashlib
 import logging
+import os
+import time
+import uuid
 import endpoints
 from protorpc import messages
 from protorpc import message_types
 from protorpc import remote
 
+from google.appengine.api import memcache
 from google.appengine.ext import ndb
 
 from models import Profile
@@ -29,6 +34,13 @@ from models import ProfileForm
 from models import TeeShirtSize
 
 from utils import getUserId
+from utils import TaskBatch
+
+from encoding import encodeForms
+from schedule import addInterval
+from schedule import allConflicts
+from schedule import buildIndex
+from schedule import sessionInterval
 
 from settings import WEB_CLIENT_ID
 
@@ -45,19 +57,56 @@ from models import ConferenceQueryForms
 from models import Session
 from models import SessionForm
 from models import SessionForms
+from models import WishlistConflictForm
+from models import WishlistConflictForms
+from models import ConferenceBundle
+from models import ConferenceStats
+from models import ConferenceStatsForm
+from models import SessionTypeCount
+from models import RegistrationTicket
+from models import RushWorker
+from models import RegistrationStatusForm
+
+from models import Speaker
+from models import SpeakerConference
+from models import SpeakerForm
+from models import SpeakerForms
 
 from models import BooleanMessage
 from models import ConflictException
+from models import RateLimitedException
 
-from google.appengine.api import memcache
+from cache import TwoTierCache
+from ratelimit import RateLimiter
 from models import StringMessage
-from google.appengine.api import taskqueue
 
 CONF_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
 )
 
+CONF_CONDITIONAL_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    ifNoneMatch=messages.StringField(2),
+)
+
+CONF_RUSH_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    enabled=messages.BooleanField(2),
+)
+
+TICKET_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    ticket=messages.StringField(1),
+)
+
+CONDITIONAL_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    ifNoneMatch=messages.StringField(1),
+)
+
 SESSION_GET_REQUEST = endpoints.ResourceContainer(
     SessionForm,
     websafeConferenceKey=messages.StringField(1),
@@ -77,6 +126,7 @@ SESSION_BY_SPEAKER = endpoints.ResourceContainer(
 SESSION_ADD_WISH_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeSessionKey=messages.StringField(1),
+    allowConflicts=messages.BooleanField(2),
 )
 
 CONF_BY_TOPIC = endpoints.ResourceContainer(
@@ -87,6 +137,7 @@ CONF_BY_TOPIC = endpoints.ResourceContainer(
 SESSION_BY_CITY = endpoints.ResourceContainer(
     message_types.VoidMessage,
     city=messages.StringField(1),
+    encoding=messages.StringField(2),
 )
 
 
@@ -122,6 +173,41 @@ FIELDS =    {
             }
 
 MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
+MEMCACHE_BUNDLE_KEY = "CONFERENCE_BUNDLE:%s"
+MEMCACHE_TOP_SPEAKERS_KEY = "TOP_SPEAKERS"
+TOP_SPEAKERS_EXPIRY = 10 * 60 # seconds
+
+# rush mode registration tickets
+RUSH_QUEUED = 'QUEUED'
+RUSH_ADMITTED = 'ADMITTED'
+RUSH_REJECTED = 'REJECTED'
+# one admission transaction touches the conference + one profile per ticket (max 25 entity groups)
+RUSH_BATCH_SIZE = 20
+RUSH_MAX_BATCHES = 50
+# the admission worker re-runs every interval (seconds) while tickets may be queued,
+# holding a lease so a conference has one worker; a lease not renewed for
+# RUSH_LEASE seconds (the worker died) can be taken over
+RUSH_WORKER_INTERVAL = 1
+RUSH_LEASE = 60
+# seconds a worker keeps polling after the last ticket was queued, so the
+# ticket query (eventually consistent) has caught up before it stops
+RUSH_IDLE = 10
+MEMCACHE_RUSH_QUEUED_KEY = 'RUSH_QUEUED:%s'
+
+# requests per minute, per user & in total, for the unbounded scans
+RATE_LIMITS = {
+    'queryConferences': RateLimiter('queryConferences', per_user=30, total=600),
+    'getSessionByCity': RateLimiter('getSessionByCity', per_user=30, total=600),
+    'filterPlayground': RateLimiter('filterPlayground', per_user=10, total=100),
+}
+
+# hot, small, rarely changing values: kept in the instance for a few seconds in front of memcache
+ANNOUNCEMENT_CACHE = TwoTierCache('announcement', local_ttl=30)
+FEATURED_SPEAKER_CACHE = TwoTierCache('featuredSpeaker', local_ttl=30)
+# no local tier: a rename bumps the ETags of the organizer's conferences at once,
+# so every instance must see the new name at once too
+DISPLAY_NAME_CACHE = TwoTierCache('displayName', local_ttl=0)
+TOP_SPEAKERS_CACHE = TwoTierCache('topSpeakers', local_ttl=60, memcache_ttl=TOP_SPEAKERS_EXPIRY)
 
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -168,6 +254,7 @@ class ConferenceApi(remote.Service):
                 displayName = user.nickname(),
                 mainEmail= user.email(),
                 teeShirtSize = str(TeeShirtSize.NOT_SPECIFIED),
+                wishlistSchedule = [],
             )
             profile.put()
 
@@ -181,12 +268,17 @@ class ConferenceApi(remote.Service):
 
         # if saveProfile(), process user-modifyable fields
         if save_request:
+            displayName = prof.displayName
             for field in ('displayName', 'teeShirtSize'):
                 if hasattr(save_request, field):
                     val = getattr(save_request, field)
                     if val:
                         setattr(prof, field, str(val))
             prof.put()
+            # the organizer name is part of every ConferenceForm, so invalidate their ETags
+            if prof.displayName != displayName:
+                DISPLAY_NAME_CACHE.delete(prof.key.id())
+                self._bumpConferenceVersions(prof.key)
 
         # return ProfileForm
         return self._copyProfileToForm(prof)
@@ -222,10 +314,49 @@ class ConferenceApi(remote.Service):
                 setattr(cf, field.name, conf.key.urlsafe())
         if displayName:
             setattr(cf, 'organizerDisplayName', displayName)
+        cf.etag = self._conferenceETag(conf)
         cf.check_initialized()
         return cf
 
 
+    @staticmethod
+    def _conferenceETag(conf):
+        """Return the ETag for a conference and everything hanging off it."""
+        return '"%s-%d"' % (conf.key.id(), conf.version or 0)
+
+
+    @staticmethod
+    def _contentETag(value):
+        """Return an ETag computed from a (memcached) string value."""
+        return '"%s"' % hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+    @staticmethod
+    @ndb.transactional()
+    def _bumpConferenceVersions(ancestor_key):
+        """Bump the version of the conference(s) under ancestor_key."""
+        confs = Conference.query(ancestor=ancestor_key).fetch()
+        for conf in confs:
+            conf.version = (conf.version or 0) + 1
+        ndb.put_multi(confs)
+
+
+    def _getConferenceOr404(self, wsck):
+        """Return Conference for a websafeConferenceKey; bail if not found."""
+        conf = ndb.Key(urlsafe=wsck).get()
+        if not conf:
+            raise endpoints.NotFoundException('No conference found with key: %s' % wsck)
+        return conf
+
+    def _getSessionOr404(self, wssk):
+        """Return Session for a websafeSessionKey; bail if not found."""
+        key = ndb.Key(urlsafe=wssk)
+        session = key.get() if key.kind() == 'Session' else None
+        if not session:
+            raise endpoints.NotFoundException('No session found with key: %s' % wssk)
+        return session
+
+
     def _createConferenceObject(self, request):
         """Create or update Conference object, returning ConferenceForm/request."""
         # preload necessary data items
@@ -241,6 +372,8 @@ class ConferenceApi(remote.Service):
         data = {field.name: getattr(request, field.name) for field in request.all_fields()}
         del data['websafeKey']
         del data['organizerDisplayName']
+        del data['etag']
+        del data['notModified']
 
         # add default values for those missing (both data model & outbound Message)
         for df in DEFAULTS:
@@ -271,28 +404,62 @@ class ConferenceApi(remote.Service):
         c_key = ndb.Key(Conference, c_id, parent=p_key)
         data['key'] = c_key
         data['organizerUserId'] = request.organizerUserId = user_id
+        data['sessionListComplete'] = True
 
         # create Conference, send email to organizer confirming
         # creation of Conference & return (modified) ConferenceForm
-        Conference(**data).put()
-        taskqueue.add(params={'email': user.email(), 'conferenceInfo': repr(request)},
-                      url='/tasks/send_confirmation_email')
+        tasks = TaskBatch()
+        tasks.add('/tasks/send_confirmation_email',
+                  {'email': user.email(), 'conferenceInfo': repr(request)})
+        self._putAndEnqueue([Conference(**data)], tasks)
 
         return request
 
+    @ndb.transactional()
+    def _putAndEnqueue(self, entities, tasks):
+        """Put entities and flush their buffered tasks in one transaction,
+        so the tasks only run if the write commits."""
+        keys = ndb.put_multi(entities)
+        tasks.flush()
+        return keys
+
     @endpoints.method(ConferenceQueryForms, ConferenceForms,
                 path='queryConferences',
                 http_method='POST',
                 name='queryConferences')
     def queryConferences(self, request):
         """Query for conferences."""
+        self._checkRateLimit('queryConferences')
         conferences = self._getQuery(request)
 
          # return individual ConferenceForm object per Conference
-        return ConferenceForms(
+        return self._encodeForms(ConferenceForms(
             items=[self._copyConferenceToForm(conf, "") \
             for conf in conferences]
-        )
+        ), request.encoding)
+
+    def _checkRateLimit(self, method):
+        """Reject the request if the user (or everyone together) called method too often.
+        Signed out callers are counted per client IP, so they do not share one bucket."""
+        user = endpoints.get_current_user()
+        if user:
+            caller = user.email()
+        else:
+            caller = 'ip:%s' % os.environ.get('REMOTE_ADDR', 'unknown')
+        retry = RATE_LIMITS[method].check(caller)
+        if retry:
+            raise RateLimitedException(
+                'Too many %s requests, retry after %d seconds' % (method, retry))
+
+    def _encodeForms(self, forms, encoding):
+        """Replace the items of a *Forms message with a compact payload if an encoding was requested."""
+        if not encoding:
+            return forms
+        try:
+            payload = encodeForms(forms, encoding)
+        except ValueError, e:
+            raise endpoints.BadRequestException(str(e))
+        return type(forms)(payload=payload, encoding=encoding)
 
     @endpoints.method(ConferenceForm, ConferenceForm, path='conference',
             http_method='POST', name='createConference')
@@ -325,6 +492,7 @@ class ConferenceApi(remote.Service):
     @endpoints.method(message_types.VoidMessage, ConferenceForms, path='filterPlayground',
                       http_method='POST', name='filterPlayground')
     def filterPlayground(self, request):
+        self._checkRateLimit('filterPlayground')
         q = Conference.query()
         q = q.filter(Conference.city == "London")
         q = q.filter(Conference.topics == "Medical Innovations")
@@ -395,6 +563,7 @@ class ConferenceApi(remote.Service):
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % wsck)
+        stats = self._getStats(conf)
 
         # register
         if reg:
@@ -411,6 +580,8 @@ class ConferenceApi(remote.Service):
             # register user, take away one seat
             prof.conferenceKeysToAttend.append(wsck)
             conf.seatsAvailable -= 1
+            conf.version = (conf.version or 0) + 1
+            stats.registrations += 1
             retval = True
 
         # unregister
@@ -421,13 +592,18 @@ class ConferenceApi(remote.Service):
                 # unregister user, add back one seat
                 prof.conferenceKeysToAttend.remove(wsck)
                 conf.seatsAvailable += 1
+                conf.version = (conf.version or 0) + 1
+                stats.registrations -= 1
                 retval = True
             else:
                 retval = False
 
         # write things back to the datastore & return
-        prof.put()
-        conf.put()
+        if retval:
+            ndb.put_multi([prof, conf, stats])
+        else:
+            prof.put()
+            conf.put()
         return BooleanMessage(data=retval)
 
 
@@ -435,7 +611,12 @@ class ConferenceApi(remote.Service):
             path='conference/{websafeConferenceKey}',
             http_method='POST', name='registerForConference')
     def registerForConference(self, request):
-        """Register user for selected conference."""
+        """Register user for selected conference.
+        In rush mode the request is queued and a ticket returned instead."""
+        conf = self._getConferenceOr404(request.websafeConferenceKey)
+        if conf.rushMode:
+            return self._queueRegistration(conf)
+        self._ensureStats(request.websafeConferenceKey)
         return self._conferenceRegistration(request)
 
 
@@ -444,6 +625,7 @@ class ConferenceApi(remote.Service):
             http_method='DELETE', name='unregisterFromConference')
     def unregisterFromConference(self, request):
         """Register user for selected conference."""
+        self._ensureStats(request.websafeConferenceKey)
         return self._conferenceRegistration(request, reg=False)
 
 
@@ -477,23 +659,34 @@ class ConferenceApi(remote.Service):
 
         return ConferenceForms(items=[self._copyConferenceToForm(conf, "") for conf in conferences])
 
-    @endpoints.method(CONF_GET_REQUEST, ConferenceForm,
+    @endpoints.method(CONF_CONDITIONAL_GET_REQUEST, ConferenceForm,
             path='conference/{websafeConferenceKey}',
             http_method='GET', name='getConference')
     def getConference(self, request):
-        """Return requested conference (by websafeConferenceKey)."""
+        """Return requested conference (by websafeConferenceKey).
+        If ifNoneMatch matches the current ETag only the ETag is returned."""
         # get Conference object from request; bail if not found
-        conf = ndb.Key(urlsafe=request.websafeConferenceKey).get()
-        if not conf:
-            raise endpoints.NotFoundException('No conference found with key: %s' % request.websafeConferenceKey)
-        prof = conf.key.parent().get()
+        conf = self._getConferenceOr404(request.websafeConferenceKey)
+        etag = self._conferenceETag(conf)
+        if request.ifNoneMatch == etag:
+            return ConferenceForm(etag=etag, notModified=True)
         # return ConferenceForm
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        return self._copyConferenceToForm(conf, self._getDisplayName(conf.key.parent()))
+
+    @staticmethod
+    def _getDisplayName(p_key):
+        """Return the displayName of the Profile at p_key (cached)."""
+        displayName = DISPLAY_NAME_CACHE.get(p_key.id())
+        if displayName is None:
+            prof = p_key.get()
+            displayName = getattr(prof, 'displayName', None) or ''
+            DISPLAY_NAME_CACHE.set(p_key.id(), displayName)
+        return displayName
 
     @staticmethod
     def _cacheAnnouncement():
-        """Create Announcement & assign to memcache; used by
-        memcache cron job & putAnnouncement().
+        """Create Announcement & assign to the cache; used by
+        memcache cron job & getAnnouncement().
         """
         confs = Conference.query(ndb.AND(
             Conference.seatsAvailable <= 5,
@@ -507,26 +700,32 @@ class ConferenceApi(remote.Service):
                 'Last chance to attend! The following conferences '
                 'are nearly sold out:',
                 ', '.join(conf.name for conf in confs))
-            memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
         else:
-            # If there are no sold out conferences,
-            # delete the memcache announcements entry
+            # If there are no sold out conferences, cache an empty
+            # announcement so getAnnouncement() does not rerun the query
             announcement = ""
-            memcache.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
+        ANNOUNCEMENT_CACHE.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
 
         return announcement
 
-    @endpoints.method(message_types.VoidMessage, StringMessage,
+    @endpoints.method(CONDITIONAL_GET_REQUEST, StringMessage,
             path='conference/announcement/get',
             http_method='GET', name='getAnnouncement')
     def getAnnouncement(self, request):
-        """Return Announcement from memcache."""
+        """Return Announcement from the cache."""
         # TODO 1
-        # return an existing announcement from Memcache or an empty string.
-        announcement = memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY)
-        if not announcement:
-            announcement = ''
-        return StringMessage(data=announcement)
+        # return an existing announcement from the cache, or build it if it is not there.
+        announcement = ANNOUNCEMENT_CACHE.get(MEMCACHE_ANNOUNCEMENTS_KEY)
+        if announcement is None:
+            announcement = self._cacheAnnouncement()
+        return self._conditionalString(announcement, request.ifNoneMatch)
+
+    def _conditionalString(self, value, ifNoneMatch):
+        """Return StringMessage for value, leaving out the value if ifNoneMatch is current."""
+        etag = self._contentETag(value)
+        if ifNoneMatch == etag:
+            return StringMessage(data='', etag=etag, notModified=True)
+        return StringMessage(data=value, etag=etag)
 
     ####################### Begin Project 4 work ###################
 
@@ -546,16 +745,38 @@ class ConferenceApi(remote.Service):
         sf.check_initialized()
         return sf
 
-    @endpoints.method(CONF_GET_REQUEST, SessionForms,
+    @endpoints.method(CONF_CONDITIONAL_GET_REQUEST, SessionForms,
             path='conference/sessions/{websafeConferenceKey}',
             http_method='GET', name='getConferenceSessions')
     def getConferenceSessions(self, request):
-        """Given a websaveConferenceKey, return all sessions"""
-        sessions = Session.query()
-        sessions = sessions.filter(Session.webSafeConfId == request.websafeConferenceKey)
+        """Given a websaveConferenceKey, return all sessions
+        (only the ETag if ifNoneMatch is current)."""
+        # the conference version is bumped by createSession, so check it before reading the sessions
+        conf = self._getConferenceOr404(request.websafeConferenceKey)
+        etag = self._conferenceETag(conf)
+        if request.ifNoneMatch == etag:
+            return SessionForms(etag=etag, notModified=True)
+
+        sessions = self._getConferenceSessions(conf)
 
         # return set of SessionForm objects one per Session
-        return SessionForms(items=[self._copySessionToForm(sn) for sn in sessions])
+        return SessionForms(items=[self._copySessionToForm(sn) for sn in sessions], etag=etag)
+
+    @staticmethod
+    def _getConferenceSessions(conf):
+        """Return the Sessions of conf. They are read by key from its sessionList,
+        which createSession updates in the same transaction as the version, so
+        they always match the ETag; conferences whose sessionList has not been
+        backfilled yet also run the (eventually consistent) query for the older
+        sessions, merged with the list by key."""
+        wssks = list(conf.sessionList)
+        if not conf.sessionListComplete:
+            listed = set(wssks)
+            for key in Session.query(Session.webSafeConfId == conf.key.urlsafe()).fetch(keys_only=True):
+                if key.urlsafe() not in listed:
+                    wssks.append(key.urlsafe())
+        sessions = ndb.get_multi([ndb.Key(urlsafe=wssk) for wssk in wssks])
+        return [sesn for sesn in sessions if sesn]
 
     @endpoints.method(SESSION_BY_TYPE, SessionForms,
             path='conference/{websafeConferenceKey}/sessions/{typeOfSession}',
@@ -574,11 +795,76 @@ class ConferenceApi(remote.Service):
             http_method='GET', name='getSessionsBySpeaker')
     def getSessionsBySpeaker(self, request):
         """Given a speaker, return all sessions given by this particular speaker, across all conferences"""
-        sessions = Session.query()
-        sessions = sessions.filter(Session.speaker == request.speaker)
+        speaker_future = self._speakerKey(request.speaker).get_async()
+        # sessions created before Speaker entities existed only have the name,
+        # until the session_speakers job links them
+        legacy = Session.query(Session.speaker == request.speaker).fetch(keys_only=True)
+        speaker = speaker_future.get_result()
+        s_keys = list(speaker.sessionKeys) if speaker else []
+        linked = set(s_keys)
+        s_keys.extend(key for key in legacy if key not in linked)
+        sessions = ndb.get_multi(s_keys)
 
         # return set of SessionForm objects one per Session
-        return SessionForms(items=[self._copySessionToForm(sesn) for sesn in sessions])
+        return SessionForms(items=[self._copySessionToForm(sesn) for sesn in sessions if sesn])
+
+    @staticmethod
+    def _speakerKey(name):
+        """Return the Speaker key for a speaker name; case and whitespace are ignored."""
+        return ndb.Key(Speaker, ' '.join(name.split()).lower())
+
+    @staticmethod
+    def _addSpeakerSession(session):
+        """Record session against its Speaker, creating the Speaker if needed.
+        Returns the number of sessions the speaker now has at the session's conference."""
+        speaker = session.speakerKey.get() or Speaker(key=session.speakerKey, name=session.speaker)
+        if session.key in speaker.sessionKeys:
+            # already counted (e.g. by a re-run backfill)
+            return [sc.sessionCount for sc in speaker.conferences
+                    if sc.webSafeConfId == session.webSafeConfId][0]
+        speaker.sessionKeys.append(session.key)
+        speaker.sessionCount = len(speaker.sessionKeys)
+        for sc in speaker.conferences:
+            if sc.webSafeConfId == session.webSafeConfId:
+                sc.sessionCount += 1
+                break
+        else:
+            sc = SpeakerConference(webSafeConfId=session.webSafeConfId, sessionCount=1)
+            speaker.conferences.append(sc)
+        speaker.put()
+        return sc.sessionCount
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _linkSpeaker(session_key):
+        """Link a Session created before Speaker entities existed to its Speaker.
+        Returns True if it was linked."""
+        session = session_key.get()
+        if session.speakerKey or session.speaker in (None, SESSION_DEFAULTS['speaker']):
+            return False
+        session.speakerKey = ConferenceApi._speakerKey(session.speaker)
+        session.put()
+        ConferenceApi._addSpeakerSession(session)
+        return True
+
+    @ndb.transactional(xg=True)
+    def _createSessionTxn(self, session, conf_key):
+        """Put session, add it to the conference (bumping its version) and update the
+        speaker counts in one transaction; the featured speaker task is only enqueued
+        (transactionally) once the speaker has more than one session at the conference."""
+        session.put()
+        conf = conf_key.get()
+        stats = self._getStats(conf)
+        conf.sessionList.append(session.key.urlsafe())
+        conf.version = (conf.version or 0) + 1
+        self._addSessionToStats(stats, session)
+        ndb.put_multi([conf, stats])
+        tasks = TaskBatch()
+        if session.speakerKey and self._addSpeakerSession(session) > 1:
+            tasks.add('/tasks/set_featured_speaker',
+                      {'websafeConferenceKey': session.webSafeConfId, 'speaker': session.speaker})
+        tasks.flush()
+        return session.key
 
     @endpoints.method(SESSION_GET_REQUEST, SessionForm,
             path='session/{websafeConferenceKey}',
@@ -625,13 +911,17 @@ class ConferenceApi(remote.Service):
         data['webSafeConfId'] = request.websafeConferenceKey
         del data['websafeSessionKey'] # this is only in the SessionForm
 
+        # the default speaker is a placeholder, not a Speaker
+        if data['speaker'] != SESSION_DEFAULTS['speaker']:
+            data['speakerKey'] = self._speakerKey(data['speaker'])
+
         logging.debug(data)
         # creation of Session, record the key to get the item & return (modified) SessionForm
-        sessionKey = Session(**data).put()
-        # start the task to update the conference featured speaker if needed
-        if data['speaker'] is not SESSION_DEFAULTS['speaker']:
-            taskqueue.add(params={'websafeConferenceKey': request.websafeConferenceKey, 'speaker': data['speaker']},
-                  url='/tasks/set_featured_speaker')
+        self._ensureStats(request.websafeConferenceKey)
+        sessionKey = self._createSessionTxn(Session(**data), conf.key)
+        if data.get('speakerKey'):
+            # the speaker's session count changed
+            TOP_SPEAKERS_CACHE.invalidate()
 
         return self._copySessionToForm(sessionKey.get())
 
@@ -640,27 +930,69 @@ class ConferenceApi(remote.Service):
         http_method='POST', name='addSessionToWishlist')
     def addSessionToWishlist(self, request):
         """Add a session (using the websaveSessionKey) to the users session wish list.
-        Returns true if successful, false otherwise."""
-        retval = None
-        # make sure user is authorized
-        user = endpoints.get_current_user()
-        if not user:
-            raise endpoints.UnauthorizedException('Authorization required')
-        # get Profile from datastore
-        user_id = getUserId(user)
-        p_key = ndb.Key(Profile, user_id)
+        Sessions whose time conflicts with one already in the list are refused
+        unless allowConflicts is set. Returns true if successful, false otherwise."""
+        # get Profile from datastore (this also makes sure user is authorized)
+        p_key = self._getProfileFromUser().key
+        session = self._getSessionOr404(request.websafeSessionKey)
+        self._ensureWishlistSchedule(p_key)
+        retval = self._addSessionToWishlistTxn(p_key, session, request.allowConflicts)
+        return BooleanMessage(data=retval)
+
+    @staticmethod
+    @ndb.transactional()
+    def _addSessionToWishlistTxn(p_key, session, allow_conflicts):
+        """Add session to the profile's wishlist and its schedule index, checking
+        for time conflicts with one binary search of the index."""
         profile = p_key.get()
+        wssk = session.key.urlsafe()
         # check if user already registered otherwise add
-        # could also check to see if the session time conflicts with others already in the list
-        if request.websafeSessionKey in profile.sessionKeysWishList:
+        if wssk in profile.sessionKeysWishList:
             raise ConflictException(
                 "You have already added this session to your wish list.")
-        else:
-            profile.sessionKeysWishList.append(request.websafeSessionKey)
-            retval = True
-
+        profile.sessionKeysWishList.append(wssk)
+        interval = sessionInterval(session)
+        if interval and profile.wishlistSchedule is not None:
+            found = addInterval(profile.wishlistSchedule, interval[0], interval[1], wssk)
+            if found and not allow_conflicts:
+                raise ConflictException(
+                    'This session conflicts with %d session(s) in your wish list: %s'
+                    % (len(found), ', '.join(found)))
         profile.put()
-        return BooleanMessage(data=retval)
+        return True
+
+    @staticmethod
+    def _ensureWishlistSchedule(p_key):
+        """Build the schedule index of a wishlist from before the index existed.
+        Runs outside transactions, since it reads every wishlisted session."""
+        profile = p_key.get()
+        if profile.wishlistSchedule is not None:
+            return
+        sessions = ndb.get_multi([ndb.Key(urlsafe=wssk) for wssk in profile.sessionKeysWishList])
+        ConferenceApi._putWishlistSchedule(p_key, profile.sessionKeysWishList, buildIndex(sessions))
+
+    @staticmethod
+    @ndb.transactional()
+    def _putWishlistSchedule(p_key, wishlist, index):
+        """Store the index built for wishlist, unless the wishlist changed meanwhile."""
+        profile = p_key.get()
+        if profile.wishlistSchedule is None and profile.sessionKeysWishList == wishlist:
+            profile.wishlistSchedule = index
+            profile.put()
+
+    @endpoints.method(message_types.VoidMessage, WishlistConflictForms,
+        path='sessions/wishlist/conflicts',
+        http_method='GET', name='getWishlistConflicts')
+    def getWishlistConflicts(self, request):
+        """Return every pair of sessions in the user's wish list whose times overlap."""
+        p_key = self._getProfileFromUser().key
+        self._ensureWishlistSchedule(p_key)
+        pairs = allConflicts(p_key.get().wishlistSchedule)
+        wssks = sorted(set(wssk for pair in pairs for wssk in pair))
+        sessions = dict(zip(wssks, ndb.get_multi([ndb.Key(urlsafe=wssk) for wssk in wssks])))
+        return WishlistConflictForms(items=[WishlistConflictForm(
+            first=self._copySessionToForm(sessions[first]),
+            second=self._copySessionToForm(sessions[second])) for first, second in pairs])
 
     @endpoints.method(message_types.VoidMessage, SessionForms,
         path='sessions/wishlist',
@@ -696,6 +1028,7 @@ class ConferenceApi(remote.Service):
             http_method='GET', name='getSessionByCity')
     def getSessionByCity(self, request):
         """Given a city, return all sessions across all conferences in the city."""
+        self._checkRateLimit('getSessionByCity')
         # get all the conferences in the city
         c = Conference.query()
         c = c.filter(Conference.city == request.city)
@@ -711,19 +1044,21 @@ class ConferenceApi(remote.Service):
         sessions = sessions.filter(Session.webSafeConfId.IN(confWebKeys))
 
         # return set of SessionForm objects one per Session
-        return SessionForms(items=[self._copySessionToForm(sesn) for sesn in sessions])
+        return self._encodeForms(
+            SessionForms(items=[self._copySessionToForm(sesn) for sesn in sessions]), request.encoding)
 
     @staticmethod
     def _cacheFeaturedSpeaker(wsck, speaker):
-        """Create the featured speaker announcement & assign to memcache.
+        """Create the featured speaker announcement & assign to the cache.
         used by getFeaturedSpeaker().
         The announcement will have the following format:
         'Featured Speaker: <speaker>, Sessions: <session1>, <session2>, ...
         """
-        sessions = Session.query()
-        sessions = sessions.filter(Session.webSafeConfId == wsck)
-        sessions = sessions.filter(Session.speaker == speaker)
-        sessions = sessions.fetch()
+        spkr = ConferenceApi._speakerKey(speaker).get()
+        if not spkr:
+            return
+        sessions = [sesn for sesn in ndb.get_multi(spkr.sessionKeys)
+                    if sesn and sesn.webSafeConfId == wsck]
         logging.debug(speaker)
         if(len(sessions) < 2):
             return
@@ -732,21 +1067,358 @@ class ConferenceApi(remote.Service):
             announcement += "%s, " % session.name
         # might want to check that the websafeConferenceKey is not none
         # slice off the trailing ", "
-        memcache.set(wsck, announcement[:-2])
+        FEATURED_SPEAKER_CACHE.set(wsck, announcement[:-2])
         logging.debug(announcement)
         return announcement
 
-    @endpoints.method(CONF_GET_REQUEST, StringMessage,
+    @endpoints.method(CONF_CONDITIONAL_GET_REQUEST, StringMessage,
             path='conference/{websafeConferenceKey}/featuredspeaker/get',
             http_method='GET', name='getFeaturedSpeaker')
     def getFeaturedSpeaker(self, request):
-        """Return featured speaker for the conference from memcache (if there is one, '' if none)."""
+        """Return featured speaker for the conference from the cache (if there is one, '' if none)."""
         logging.debug(request.websafeConferenceKey)
-        info = memcache.get(request.websafeConferenceKey)
+        info = FEATURED_SPEAKER_CACHE.get(request.websafeConferenceKey)
         logging.debug(info)
         if not info:
             info = ''
-        return StringMessage(data=info)
+        return self._conditionalString(info, request.ifNoneMatch)
+
+    @endpoints.method(CONF_GET_REQUEST, ConferenceBundle,
+            path='conference/{websafeConferenceKey}/bundle',
+            http_method='GET', name='getConferenceBundle')
+    def getConferenceBundle(self, request):
+        """Return the conference, organizer name, sessions, featured speaker and the
+        user's registration/wishlist flags in one response (for the detail page)."""
+        wsck = request.websafeConferenceKey
+        c_key = ndb.Key(urlsafe=wsck)
+        ctx = ndb.get_context()
+
+        # start all the independent reads at once
+        conf_future = c_key.get_async()
+        shared_future = ctx.memcache_get(MEMCACHE_BUNDLE_KEY % wsck)
+        user = endpoints.get_current_user()
+        prof_future = ndb.Key(Profile, getUserId(user)).get_async() if user else None
+
+        conf = conf_future.get_result()
+        if not conf:
+            raise endpoints.NotFoundException('No conference found with key: %s' % wsck)
+
+        # organizer name & sessions are the same for every user; they are cached
+        # together with the conference version they were read at. Only sessions
+        # read from a complete sessionList are known to match that version.
+        shared = shared_future.get_result()
+        if not shared or shared[0] != conf.version:
+            organizer_future = c_key.parent().get_async()
+            sessions = self._getConferenceSessions(conf)
+            organizer = organizer_future.get_result()
+            shared = (conf.version, getattr(organizer, 'displayName', ''), sessions)
+            if conf.sessionListComplete:
+                ctx.memcache_set(MEMCACHE_BUNDLE_KEY % wsck, shared)
+        version, displayName, sessions = shared
+
+        bundle = ConferenceBundle(
+            conference=self._copyConferenceToForm(conf, displayName),
+            sessions=[self._copySessionToForm(sesn) for sesn in sessions],
+            featuredSpeaker=FEATURED_SPEAKER_CACHE.get(wsck) or '',
+        )
+        prof = prof_future.get_result() if prof_future else None
+        if prof:
+            bundle.isAttending = wsck in prof.conferenceKeysToAttend
+            wishlist = set(prof.sessionKeysWishList)
+            bundle.wishlistSessionKeys = [sf.websafeSessionKey for sf in bundle.sessions
+                                          if sf.websafeSessionKey in wishlist]
+        return bundle
+
+# - - - Registration rush mode - - - - - - - - - - - - - - - - - - -
+
+    def _queueRegistration(self, conf):
+        """Queue a registration for a rush mode conference; returns the ticket."""
+        prof = self._getProfileFromUser()
+        wsck = conf.key.urlsafe()
+        if wsck in prof.conferenceKeysToAttend:
+            raise ConflictException(
+                "You have already registered for this conference")
+
+        # one ticket per user & conference, so repeated requests keep their place
+        t_key = ndb.Key(RegistrationTicket, wsck, parent=prof.key)
+        ticket = t_key.get()
+        if not ticket or ticket.status != RUSH_QUEUED:
+            RegistrationTicket(key=t_key, webSafeConfId=wsck, status=RUSH_QUEUED).put()
+        self._startRushWorker(wsck)
+        return BooleanMessage(data=False, ticket=t_key.urlsafe())
+
+    @staticmethod
+    def _startRushWorker(wsck):
+        """Make sure the admission worker of a conference is running.
+
+        The time a ticket was last queued is recorded in memcache before the
+        lease is checked, so a worker that is just stopping sees it and keeps
+        going. Only a free lease is written, so the queue path does not
+        contend on one entity."""
+        memcache.set(MEMCACHE_RUSH_QUEUED_KEY % wsck, time.time())
+        lease = RushWorker.get_by_id(wsck)
+        if lease and lease.expires > datetime.now():
+            return
+        ConferenceApi._takeRushLease(wsck)
+
+    @staticmethod
+    @ndb.transactional()
+    def _takeRushLease(wsck):
+        """Take the worker lease of a conference if it is free, and start the worker."""
+        lease = RushWorker.get_by_id(wsck)
+        if lease and lease.expires > datetime.now():
+            return
+        lease = RushWorker(id=wsck, token=uuid.uuid4().hex)
+        ConferenceApi._scheduleRushWorker(lease, countdown=0)
+
+    @staticmethod
+    @ndb.transactional()
+    def _renewRushLease(wsck, token):
+        """Extend the lease of the worker holding token and schedule its next run."""
+        lease = RushWorker.get_by_id(wsck)
+        if lease and lease.token == token:
+            ConferenceApi._scheduleRushWorker(lease, countdown=RUSH_WORKER_INTERVAL)
+
+    @staticmethod
+    def _scheduleRushWorker(lease, countdown):
+        """Put lease, expiring RUSH_LEASE seconds after the next run, and enqueue
+        that run; call inside a transaction so both happen or neither."""
+        lease.expires = datetime.fromtimestamp(time.time() + countdown + RUSH_LEASE)
+        lease.put()
+        tasks = TaskBatch()
+        tasks.add('/tasks/admit_registrations',
+                  {'websafeConferenceKey': lease.key.id(), 'token': lease.token}, countdown=countdown)
+        tasks.flush()
+
+    @staticmethod
+    @ndb.transactional()
+    def _releaseRushLease(wsck, token):
+        """Free the lease held by token."""
+        lease = RushWorker.get_by_id(wsck)
+        if lease and lease.token == token:
+            lease.key.delete()
+
+    @staticmethod
+    def _recentlyQueued(wsck):
+        """Return True if a ticket was queued less than RUSH_IDLE seconds ago."""
+        queued = memcache.get(MEMCACHE_RUSH_QUEUED_KEY % wsck)
+        return queued is not None and queued > time.time() - RUSH_IDLE
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _admitTickets(conf_key, ticket_keys):
+        """Admit queued tickets in order while there are seats, rejecting the rest.
+        Returns the number of tickets that were still queued."""
+        wsck = conf_key.urlsafe()
+        conf = conf_key.get()
+        stats = ConferenceApi._getStats(conf)
+        tickets = ndb.get_multi(ticket_keys)
+        profiles = ndb.get_multi([t_key.parent() for t_key in ticket_keys])
+        changed = []
+        for ticket, prof in zip(tickets, profiles):
+            if not ticket or ticket.status != RUSH_QUEUED:
+                continue
+            if wsck in prof.conferenceKeysToAttend:
+                ticket.status = RUSH_ADMITTED
+            elif conf.seatsAvailable <= 0:
+                ticket.status = RUSH_REJECTED
+            else:
+                prof.conferenceKeysToAttend.append(wsck)
+                conf.seatsAvailable -= 1
+                stats.registrations += 1
+                ticket.status = RUSH_ADMITTED
+                changed.append(prof)
+            changed.append(ticket)
+        if changed:
+            conf.version = (conf.version or 0) + 1
+            ndb.put_multi(changed + [conf, stats])
+        return len([t for t in changed if isinstance(t, RegistrationTicket)])
+
+    @staticmethod
+    def _admitQueuedRegistrations(wsck, token):
+        """Admit the queued tickets of a conference in FIFO batches; one run of the
+        admission worker holding the lease token. The worker re-runs itself while
+        tickets may remain, and stops once the queue has been empty for RUSH_IDLE
+        seconds."""
+        lease = RushWorker.get_by_id(wsck)
+        if not lease or lease.token != token:
+            # the lease was taken over by another worker
+            return
+        ConferenceApi._ensureStats(wsck)
+        conf_key = ndb.Key(urlsafe=wsck)
+        empty = False
+        for _ in range(RUSH_MAX_BATCHES):
+            t_keys = RegistrationTicket.query(
+                RegistrationTicket.webSafeConfId == wsck,
+                RegistrationTicket.status == RUSH_QUEUED,
+            ).order(RegistrationTicket.created).fetch(RUSH_BATCH_SIZE, keys_only=True)
+            if not t_keys:
+                empty = True
+                break
+            if not ConferenceApi._admitTickets(conf_key, t_keys):
+                # the query index has not caught up with the last batch yet
+                break
+        if not empty or ConferenceApi._recentlyQueued(wsck):
+            ConferenceApi._renewRushLease(wsck, token)
+            return
+        ConferenceApi._releaseRushLease(wsck, token)
+        # a ticket queued while the lease was being released found it still held
+        if ConferenceApi._recentlyQueued(wsck):
+            ConferenceApi._takeRushLease(wsck)
+
+    @endpoints.method(TICKET_GET_REQUEST, RegistrationStatusForm,
+            path='registration/{ticket}',
+            http_method='GET', name='getRegistrationStatus')
+    def getRegistrationStatus(self, request):
+        """Return the status (QUEUED, ADMITTED or REJECTED) of one of the user's queued registrations."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        t_key = ndb.Key(urlsafe=request.ticket)
+        # tickets are children of their user's Profile; other users' are not found either
+        ticket = None
+        if t_key.kind() == 'RegistrationTicket' and t_key.parent() == ndb.Key(Profile, getUserId(user)):
+            ticket = t_key.get()
+        if not ticket:
+            raise endpoints.NotFoundException('No registration found with ticket: %s' % request.ticket)
+        if ticket.status == RUSH_QUEUED:
+            # make sure a worker is (still) running; a no-op while one holds the lease
+            self._startRushWorker(ticket.webSafeConfId)
+        return RegistrationStatusForm(status=ticket.status, websafeConferenceKey=ticket.webSafeConfId)
+
+    @endpoints.method(CONF_RUSH_REQUEST, BooleanMessage,
+            path='conference/{websafeConferenceKey}/rushmode',
+            http_method='POST', name='setRushMode')
+    def setRushMode(self, request):
+        """Turn rush mode registration on or off; open only to the organizer of the conference."""
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required')
+        conf = self._setRushMode(request.websafeConferenceKey, getUserId(user), bool(request.enabled))
+        if not conf.rushMode:
+            # admit whoever is still queued
+            self._startRushWorker(request.websafeConferenceKey)
+        return BooleanMessage(data=conf.rushMode)
+
+    @ndb.transactional()
+    def _setRushMode(self, wsck, user_id, enabled):
+        """Set Conference.rushMode; open only to the organizer of the conference."""
+        conf = self._getConferenceOr404(wsck)
+        if user_id != conf.organizerUserId:
+            raise endpoints.UnauthorizedException('Only conference organizer is authorized to change rush mode.')
+        conf.rushMode = enabled
+        conf.version = (conf.version or 0) + 1
+        conf.put()
+        return conf
+
+# - - - Conference statistics - - - - - - - - - - - - - - - - - - -
+
+    @staticmethod
+    def _statsKey(conf_key):
+        """Return the key of the ConferenceStats of a conference."""
+        return ndb.Key(ConferenceStats, 'stats', parent=conf_key)
+
+    @staticmethod
+    def _newStats(conf):
+        """Return empty ConferenceStats for conf."""
+        return ConferenceStats(key=ConferenceApi._statsKey(conf.key),
+                               sessionsByType={},
+                               registrations=(conf.maxAttendees or 0) - (conf.seatsAvailable or 0),
+                               maxAttendees=conf.maxAttendees or 0)
+
+    @staticmethod
+    def _getStats(conf):
+        """Return the ConferenceStats of conf for updating inside a transaction.
+        Call _ensureStats() before the transaction, so they are only created
+        empty here if the conference has no sessions yet (or in a rare race,
+        which the reconcile job fixes)."""
+        return ConferenceApi._statsKey(conf.key).get() or ConferenceApi._newStats(conf)
+
+    @staticmethod
+    def _ensureStats(wsck):
+        """Compute the stats of conferences from before the rollup existed.
+        Runs outside transactions, since it reads all the conference's sessions."""
+        c_key = ndb.Key(urlsafe=wsck)
+        if not ConferenceApi._statsKey(c_key).get():
+            conf = c_key.get()
+            if conf:
+                ConferenceApi._reconcileStats(conf)
+
+    @staticmethod
+    def _addSessionToStats(stats, session):
+        """Count session in stats."""
+        stats.sessionCount += 1
+        by_type = stats.sessionsByType or {}
+        by_type[session.type] = by_type.get(session.type, 0) + 1
+        stats.sessionsByType = by_type
+        if session.speakerKey and session.speakerKey.id() not in stats.speakers:
+            stats.speakers.append(session.speakerKey.id())
+
+    @staticmethod
+    def _computeStats(conf):
+        """Compute ConferenceStats for conf from its sessions and seats; the
+        sessions of conferences from before sessionList are found by query."""
+        stats = ConferenceApi._newStats(conf)
+        for session in ConferenceApi._getConferenceSessions(conf):
+            ConferenceApi._addSessionToStats(stats, session)
+        return stats
+
+    @staticmethod
+    @ndb.transactional()
+    def _putReconciledStats(stats, sessionCount):
+        """Write recomputed stats unless the conference changed since they were computed.
+        Returns True if the stored stats were off."""
+        conf = stats.key.parent().get()
+        # createSession appends to sessionList even before it is complete, so
+        # its length changes with every new session either way
+        if len(conf.sessionList) != sessionCount:
+            # a session was added meanwhile; the next reconciliation picks it up
+            return False
+        stats.registrations = (conf.maxAttendees or 0) - (conf.seatsAvailable or 0)
+        old = stats.key.get()
+        if old and old.to_dict() == stats.to_dict():
+            return False
+        stats.put()
+        return True
+
+    @staticmethod
+    def _reconcileStats(conf):
+        """Recompute the stats of conf, fixing any drift; used by the reconcile job."""
+        stats = ConferenceApi._computeStats(conf)
+        return ConferenceApi._putReconciledStats(stats, len(conf.sessionList))
+
+    @endpoints.method(CONF_GET_REQUEST, ConferenceStatsForm,
+            path='conference/{websafeConferenceKey}/stats',
+            http_method='GET', name='getConferenceStats')
+    def getConferenceStats(self, request):
+        """Return session, speaker and registration counts for a conference."""
+        stats = self._statsKey(ndb.Key(urlsafe=request.websafeConferenceKey)).get()
+        if not stats:
+            # conferences from before the rollup existed; computed once, then maintained
+            conf = self._getConferenceOr404(request.websafeConferenceKey)
+            stats = self._computeStats(conf)
+            self._putReconciledStats(stats, len(conf.sessionList))
+        return ConferenceStatsForm(
+            sessionCount=stats.sessionCount,
+            sessionsByType=[SessionTypeCount(type=t, count=c)
+                            for t, c in sorted((stats.sessionsByType or {}).items())],
+            speakerCount=len(stats.speakers),
+            registrations=stats.registrations,
+            maxAttendees=stats.maxAttendees,
+            seatUtilization=float(stats.registrations) / stats.maxAttendees if stats.maxAttendees else 0.0,
+        )
+
+    @endpoints.method(message_types.VoidMessage, SpeakerForms,
+            path='speakers/top',
+            http_method='GET', name='getTopSpeakers')
+    def getTopSpeakers(self, request):
+        """Return the speakers with the most sessions across all conferences."""
+        items = TOP_SPEAKERS_CACHE.get(MEMCACHE_TOP_SPEAKERS_KEY)
+        if items is None:
+            speakers = Speaker.query().order(-Speaker.sessionCount).fetch(10)
+            items = [(spkr.name, spkr.sessionCount) for spkr in speakers]
+            TOP_SPEAKERS_CACHE.set(MEMCACHE_TOP_SPEAKERS_KEY, items)
+        return SpeakerForms(items=[SpeakerForm(name=name, sessionCount=count) for name, count in items])
 
 # registers API
 api = endpoints.api_server([ConferenceApi]) 
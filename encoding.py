@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""encoding.py
+
+Udacity conference server-side Python App Engine compact columnar
+encoding for large ConferenceForms/SessionForms responses
+
+"""
+
+import json
+
+from protorpc import messages
+
+# encodings a client may ask for. Binary or gzipped payloads would have to
+# be base64 encoded in the JSON response, which costs more than they save,
+# and the frontend already gzips responses.
+ENCODINGS = ('columns',)
+
+
+def toColumns(forms):
+    """Turn a *Forms message into one array per field, so field names
+    are sent once instead of once per item."""
+    fields = sorted(forms.field_by_name('items').type.all_fields(),
+                    key=lambda field: field.number)
+    columns = {}
+    for field in fields:
+        column = []
+        for item in forms.items:
+            value = getattr(item, field.name)
+            if isinstance(value, messages.Enum):
+                value = str(value)
+            elif field.repeated:
+                value = list(value)
+            column.append(value)
+        columns[field.name] = column
+    return {
+        'fields': [field.name for field in fields],
+        'rows': len(forms.items),
+        'columns': columns,
+    }
+
+
+def encodeForms(forms, encoding):
+    """Return forms (items only) encoded as requested, as a unicode JSON string
+    (for a StringField). Raises ValueError for an unknown encoding."""
+    if encoding not in ENCODINGS:
+        raise ValueError('Unknown encoding: %s' % encoding)
+    # ensure_ascii (the default) escapes everything else, so this cannot fail
+    return json.dumps(toColumns(type(forms)(items=forms.items)), separators=(',', ':')).decode('ascii')
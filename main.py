@@ -12,18 +12,58 @@ created by wesc on 2014 may 24
 
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
+import json
+import logging
+import zlib
+
 import webapp2
 from google.appengine.api import app_identity
 from google.appengine.api import mail
-from conference import ConferenceApi
 
+# the handlers import conference/models lazily, so instances started for a
+# task or cron request do not pay for loading endpoints & protorpc
+
+# entities read per datastore batch & written per response by the export
+EXPORT_BATCH_SIZE = 500
+EXPORT_MAX_ENTITIES = 10000
+
+
+class WarmupHandler(webapp2.RequestHandler):
+    def get(self):
+        """Load the API & prime the hot caches before the instance gets its
+        first user request."""
+        # importing conference builds & registers the API config (endpoints.api_server)
+        from conference import ConferenceApi
+        from conference import ANNOUNCEMENT_CACHE
+        from conference import MEMCACHE_ANNOUNCEMENTS_KEY
+        from conference import MEMCACHE_TOP_SPEAKERS_KEY
+        from conference import TOP_SPEAKERS_CACHE
+        import batchjobs    # only to load it before the first task needs it
+
+        if ANNOUNCEMENT_CACHE.get(MEMCACHE_ANNOUNCEMENTS_KEY) is None:
+            ConferenceApi._cacheAnnouncement()
+        TOP_SPEAKERS_CACHE.get(MEMCACHE_TOP_SPEAKERS_KEY)
 
 class SetAnnouncementHandler(webapp2.RequestHandler):
     def get(self):
         """Set Announcement in Memcache."""
         # TODO 1
+        from conference import ConferenceApi
         ConferenceApi._cacheAnnouncement()
 
+class ReconcileStatsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Start the job that fixes any drift in the ConferenceStats rollups."""
+        import batchjobs
+        batchjobs.startJob('conference_stats')
+
+class AdmitRegistrationsHandler(webapp2.RequestHandler):
+    def post(self):
+        """Admit queued rush mode registrations for a conference."""
+        from conference import ConferenceApi
+        ConferenceApi._admitQueuedRegistrations(self.request.get('websafeConferenceKey'),
+                                                self.request.get('token'))
+
 class SendConfirmationEmailHandler(webapp2.RequestHandler):
     def post(self):
         """Send email confirming Conference creation."""
@@ -40,11 +80,139 @@ class SendConfirmationEmailHandler(webapp2.RequestHandler):
 class SetFeaturedSpeakerHandler(webapp2.RequestHandler):
     def post(self):
         """Check to see if the speaker is now the featured speaker and update memcache if so."""
+        from conference import ConferenceApi
         ConferenceApi._cacheFeaturedSpeaker(self.request.get('websafeConferenceKey'), self.request.get('speaker'))
 
 
+class RunBatchJobHandler(webapp2.RequestHandler):
+    def post(self):
+        """Process the next chunk of a batch job."""
+        import batchjobs
+        batchjobs.runJobChunk(int(self.request.get('job')), int(self.request.get('chunk')))
+
+class BatchJobsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Show the progress of the most recent batch jobs."""
+        import batchjobs
+        jobs = batchjobs.BatchJob.query().order(-batchjobs.BatchJob.started).fetch(20)
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps([batchjobs.jobStatus(job) for job in jobs]))
+
+    def post(self):
+        """Start a batch job (name=...) or resume one from its checkpoint (resume=<id>)."""
+        import batchjobs
+        if self.request.get('resume'):
+            job = batchjobs.BatchJob.get_by_id(int(self.request.get('resume')))
+            if not job:
+                self.abort(404)
+            if not job.done:
+                batchjobs.enqueueJobChunk(job.key.id(), job.chunks)
+        elif self.request.get('name') in batchjobs.JOBS:
+            job = batchjobs.startJob(self.request.get('name'))
+        else:
+            self.abort(400, 'name must be one of: %s' % ', '.join(sorted(batchjobs.JOBS)))
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(batchjobs.jobStatus(job)))
+
+
+class CacheStatsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Show the per tier hit counters of this instance's caches."""
+        # the caches are created when conference is imported
+        import conference
+        from cache import CACHES
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps([cache.stats() for cache in CACHES]))
+
+
+class RateLimitStatsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Show the rate limits and how many requests were shed."""
+        # the limiters are created when conference is imported
+        import conference
+        from ratelimit import LIMITERS
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps([limiter.stats() for limiter in LIMITERS]))
+
+
+def _exportValue(value):
+    """json.dumps() default for the datastore values that JSON has no type for."""
+    if hasattr(value, 'urlsafe'):
+        return value.urlsafe()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def _entityRows(entity):
+    """Return an exported Conference or Session as one row."""
+    row = entity.to_dict()
+    row['websafeKey'] = entity.key.urlsafe()
+    return [row]
+
+
+def _registrationRows(profile):
+    """Return one row per conference the Profile is registered for."""
+    return [{'userId': profile.key.id(), 'websafeConferenceKey': wsck}
+            for wsck in profile.conferenceKeysToAttend]
+
+
+class ExportHandler(webapp2.RequestHandler):
+    def get(self):
+        """Export conferences, sessions or registrations as newline delimited JSON.
+
+        At most EXPORT_MAX_ENTITIES entities are read per response, in
+        batches of EXPORT_BATCH_SIZE, so memory use does not depend on the
+        size of the kind. If there is more, the X-Export-Cursor response
+        header holds the cursor to pass back as cursor=... to continue.
+        gzip=1 returns the rows gzip compressed, compressing batch by batch.
+        """
+        from google.appengine.datastore.datastore_query import Cursor
+        from models import Conference
+        from models import Profile
+        from models import Session
+        kinds = {
+            'conferences': (Conference, _entityRows),
+            'sessions': (Session, _entityRows),
+            'registrations': (Profile, _registrationRows),
+        }
+        if self.request.get('kind') not in kinds:
+            self.abort(400, 'kind must be one of: %s' % ', '.join(sorted(kinds)))
+        kind, rows = kinds[self.request.get('kind')]
+
+        compressor = None
+        if self.request.get('gzip'):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.response.headers['Content-Type'] = 'application/gzip'
+        else:
+            self.response.headers['Content-Type'] = 'application/x-ndjson'
+
+        cursor = Cursor(urlsafe=self.request.get('cursor')) if self.request.get('cursor') else None
+        more = True
+        exported = 0
+        while more and exported < EXPORT_MAX_ENTITIES:
+            entities, cursor, more = kind.query().fetch_page(EXPORT_BATCH_SIZE, start_cursor=cursor)
+            lines = ''.join(json.dumps(row, default=_exportValue) + '\n'
+                            for entity in entities for row in rows(entity))
+            self.response.write(compressor.compress(lines) if compressor else lines)
+            exported += len(entities)
+        if compressor:
+            self.response.write(compressor.flush())
+        if more and cursor:
+            self.response.headers['X-Export-Cursor'] = cursor.urlsafe()
+        logging.info('exported %d %s', exported, self.request.get('kind'))
+
+
 app = webapp2.WSGIApplication([
+    ('/_ah/warmup', WarmupHandler),
     ('/crons/set_announcement', SetAnnouncementHandler),
+    ('/crons/reconcile_stats', ReconcileStatsHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
     ('/tasks/set_featured_speaker', SetFeaturedSpeakerHandler),
+    ('/tasks/run_batch_job', RunBatchJobHandler),
+    ('/tasks/admit_registrations', AdmitRegistrationsHandler),
+    ('/admin/batch_jobs', BatchJobsHandler),
+    ('/admin/cache_stats', CacheStatsHandler),
+    ('/admin/rate_limits', RateLimitStatsHandler),
+    ('/admin/export', ExportHandler),
 ], debug=True)
@@ -24,20 +24,30 @@ class Profile(ndb.Model):
     teeShirtSize = ndb.StringProperty(default='NOT_SPECIFIED')
     conferenceKeysToAttend = ndb.StringProperty(repeated=True)
     sessionKeysWishList = ndb.StringProperty(repeated=True)
+    # sorted interval index of the wishlist (see schedule.py); None until built
+    wishlistSchedule = ndb.JsonProperty(indexed=False)
 
 class StringMessage(messages.Message):
     """StringMessage-- outbound (single) string message"""
     data = messages.StringField(1, required=True)
+    etag = messages.StringField(2)
+    notModified = messages.BooleanField(3)
 
 # needed for conference registration
 class BooleanMessage(messages.Message):
     """BooleanMessage-- outbound Boolean value message"""
     data = messages.BooleanField(1)
+    # set when a registration was queued instead (see getRegistrationStatus)
+    ticket = messages.StringField(2)
 
 class ConflictException(endpoints.ServiceException):
     """ConflictException -- exception mapped to HTTP 409 response"""
     http_status = httplib.CONFLICT
 
+class RateLimitedException(endpoints.ServiceException):
+    """RateLimitedException -- exception mapped to HTTP 503 response"""
+    http_status = httplib.SERVICE_UNAVAILABLE
+
 class ProfileMiniForm(messages.Message):
     """ProfileMiniForm -- update Profile form message"""
     displayName = messages.StringField(1)
@@ -83,6 +93,13 @@ class Conference(ndb.Model):
     maxAttendees    = ndb.IntegerProperty()
     seatsAvailable  = ndb.IntegerProperty()
     sessionList     = ndb.StringProperty(repeated=True)
+    # sessionList holds every session (new conferences, or backfilled by the
+    # conference_session_list job), so it can be read instead of a query
+    sessionListComplete = ndb.BooleanProperty(default=False)
+    # queue registrations and admit them in batches instead of racing on this entity
+    rushMode        = ndb.BooleanProperty(default=False)
+    # bumped on every conference, session or registration write; used as the ETag
+    version         = ndb.IntegerProperty(default=1)
 
 class ConferenceForm(messages.Message):
     """ConferenceForm -- Conference outbound form message"""
@@ -99,10 +116,16 @@ class ConferenceForm(messages.Message):
     websafeKey      = messages.StringField(11)
     organizerDisplayName = messages.StringField(12)
     sessionList     = messages.StringField(13, repeated=True)
+    etag            = messages.StringField(14)
+    notModified     = messages.BooleanField(15)
+    rushMode        = messages.BooleanField(16)
 
 class ConferenceForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    # set instead of items when a compact encoding was requested (see encoding.py)
+    payload = messages.StringField(2)
+    encoding = messages.StringField(3)
 
 class ConferenceQueryForm(messages.Message):
     """ConferenceQueryForm -- Conference query inbound form message"""
@@ -113,6 +136,7 @@ class ConferenceQueryForm(messages.Message):
 class ConferenceQueryForms(messages.Message):
     """ConferenceQueryForms -- multiple ConferenceQueryForm inbound form message"""
     filters = messages.MessageField(ConferenceQueryForm, 1, repeated=True)
+    encoding = messages.StringField(2)
 
 class Session(ndb.Model):
     """Session object """
@@ -124,6 +148,7 @@ class Session(ndb.Model):
     date        = ndb.DateProperty()
     startTime   = ndb.FloatProperty()
     webSafeConfId = ndb.StringProperty()
+    speakerKey  = ndb.KeyProperty(kind='Speaker')
 
 class SessionForm(messages.Message):
     """SessionForm - Session outbound form message"""
@@ -141,4 +166,95 @@ class SessionForm(messages.Message):
 class SessionForms(messages.Message):
     """SessionForms -- multiple Session outbound form message"""
     items = messages.MessageField(SessionForm, 1, repeated=True)
+    etag = messages.StringField(2)
+    notModified = messages.BooleanField(3)
+    # set instead of items when a compact encoding was requested (see encoding.py)
+    payload = messages.StringField(4)
+    encoding = messages.StringField(5)
+
+class WishlistConflictForm(messages.Message):
+    """WishlistConflictForm -- two wishlisted sessions whose times overlap"""
+    first = messages.MessageField(SessionForm, 1)
+    second = messages.MessageField(SessionForm, 2)
+
+class WishlistConflictForms(messages.Message):
+    """WishlistConflictForms -- multiple WishlistConflictForm outbound form message"""
+    items = messages.MessageField(WishlistConflictForm, 1, repeated=True)
+
+class SpeakerConference(ndb.Model):
+    """SpeakerConference -- number of sessions a Speaker has at one conference"""
+    webSafeConfId = ndb.StringProperty()
+    sessionCount = ndb.IntegerProperty(default=0)
+
+class Speaker(ndb.Model):
+    """Speaker -- keyed by the normalized speaker name"""
+    name        = ndb.StringProperty()
+    sessionCount = ndb.IntegerProperty(default=0)
+    sessionKeys = ndb.KeyProperty(kind='Session', repeated=True)
+    conferences = ndb.StructuredProperty(SpeakerConference, repeated=True)
+
+class SpeakerForm(messages.Message):
+    """SpeakerForm -- Speaker outbound form message"""
+    name        = messages.StringField(1)
+    sessionCount = messages.IntegerField(2)
+
+class SpeakerForms(messages.Message):
+    """SpeakerForms -- multiple Speaker outbound form message"""
+    items = messages.MessageField(SpeakerForm, 1, repeated=True)
 
+class ConferenceStats(ndb.Model):
+    """ConferenceStats -- rollup of a Conference, child of the Conference"""
+    sessionCount    = ndb.IntegerProperty(default=0)
+    sessionsByType  = ndb.JsonProperty()    # set by _newStats; no shared mutable default
+    speakers        = ndb.StringProperty(repeated=True, indexed=False)
+    registrations   = ndb.IntegerProperty(default=0)
+    maxAttendees    = ndb.IntegerProperty(default=0)
+
+class SessionTypeCount(messages.Message):
+    """SessionTypeCount -- number of sessions of one type"""
+    type = messages.StringField(1)
+    count = messages.IntegerField(2)
+
+class ConferenceStatsForm(messages.Message):
+    """ConferenceStatsForm -- ConferenceStats outbound form message"""
+    sessionCount    = messages.IntegerField(1)
+    sessionsByType  = messages.MessageField(SessionTypeCount, 2, repeated=True)
+    speakerCount    = messages.IntegerField(3)
+    registrations   = messages.IntegerField(4)
+    maxAttendees    = messages.IntegerField(5)
+    seatUtilization = messages.FloatField(6)
+
+class RegistrationTicket(ndb.Model):
+    """RegistrationTicket -- queued rush mode registration, child of the Profile"""
+    webSafeConfId = ndb.StringProperty()
+    status      = ndb.StringProperty()
+    created     = ndb.DateTimeProperty(auto_now_add=True)
+
+class RushWorker(ndb.Model):
+    """RushWorker -- lease of the admission worker of a rush mode conference, keyed by its websafe key"""
+    token       = ndb.StringProperty(indexed=False)
+    expires     = ndb.DateTimeProperty(indexed=False)
+
+class RegistrationStatusForm(messages.Message):
+    """RegistrationStatusForm -- RegistrationTicket outbound form message"""
+    status = messages.StringField(1)
+    websafeConferenceKey = messages.StringField(2)
+
+class ConferenceBundle(messages.Message):
+    """ConferenceBundle -- conference detail page outbound message"""
+    conference = messages.MessageField(ConferenceForm, 1)
+    sessions = messages.MessageField(SessionForm, 2, repeated=True)
+    featuredSpeaker = messages.StringField(3)
+    isAttending = messages.BooleanField(4)
+    wishlistSessionKeys = messages.StringField(5, repeated=True)
+
+class BatchJob(ndb.Model):
+    """BatchJob -- checkpoint of a chunked job over all entities of a kind"""
+    name        = ndb.StringProperty(required=True)
+    cursor      = ndb.StringProperty(indexed=False)
+    chunks      = ndb.IntegerProperty(default=0)
+    processed   = ndb.IntegerProperty(default=0)
+    updated     = ndb.IntegerProperty(default=0)
+    done        = ndb.BooleanProperty(default=False)
+    started     = ndb.DateTimeProperty(auto_now_add=True)
+    modified    = ndb.DateTimeProperty(auto_now=True)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""ratelimit.py
+
+Udacity conference server-side Python App Engine per-user and global
+rate limits for expensive API methods, shared across instances through
+memcache counters
+
+"""
+
+import threading
+import time
+
+from google.appengine.api import memcache
+
+# every RateLimiter created, for the shed counters
+LIMITERS = []
+
+# forget the local buckets of this many users at once, to bound memory
+MAX_LOCAL_BUCKETS = 10000
+
+
+class TokenBucket(object):
+    """In-instance token bucket refilled at rate tokens per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.time()
+
+    def take(self):
+        """Take a token; returns False if the bucket is empty."""
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retryAfter(self):
+        """Seconds until the next token."""
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter(object):
+    """Allow per_user requests per user and total requests overall per window seconds.
+
+    Each instance first checks a local token bucket per user, then both
+    limits with one memcache offset_multi over per-window counters. Once a
+    counter is over its limit the instance remembers that until the window
+    ends, so the rest of the window is shed without an RPC. If memcache is
+    unavailable requests are let through.
+    """
+
+    def __init__(self, name, per_user, total, window=60):
+        self.name = name
+        self.per_user = per_user
+        self.total = total
+        self.window = window
+        self._buckets = {}
+        self._blocked = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.shed_local = 0
+        self.shed_shared = 0
+        LIMITERS.append(self)
+
+    def _takeLocal(self, user):
+        """Take a token from user's local bucket; returns seconds to wait or None."""
+        with self._lock:
+            bucket = self._buckets.get(user)
+            if bucket is None:
+                if len(self._buckets) >= MAX_LOCAL_BUCKETS:
+                    self._buckets.clear()
+                bucket = self._buckets[user] = TokenBucket(
+                    float(self.per_user) / self.window, self.per_user)
+            if bucket.take():
+                return None
+            return bucket.retryAfter()
+
+    def check(self, user):
+        """Count a request by user; returns None if allowed, else seconds to retry after."""
+        now = time.time()
+        retry = self._takeLocal(user)
+        if retry is not None:
+            self.shed_local += 1
+            return int(retry) + 1
+
+        window = int(now // self.window)
+        retry = int((window + 1) * self.window - now) + 1
+        keys = ['RATE:%s:%s:%d' % (self.name, user, window),
+                'RATE:%s:*:%d' % (self.name, window)]
+        if any(self._blocked.get(key, 0) > now for key in keys):
+            self.shed_local += 1
+            return retry
+
+        counts = memcache.offset_multi(dict((key, 1) for key in keys), initial_value=0) or {}
+        for key, limit in zip(keys, (self.per_user, self.total)):
+            if counts.get(key, 0) > limit:
+                with self._lock:
+                    # drop the blocks of earlier windows
+                    self._blocked = dict((k, end) for k, end in self._blocked.items() if end > now)
+                    self._blocked[key] = now + retry
+                self.shed_shared += 1
+                memcache.incr('RATE_SHED:%s' % self.name, initial_value=0)
+                return retry
+        self.allowed += 1
+        return None
+
+    def stats(self):
+        """Return the limits, this instance's counters and the number of requests
+        all instances shed on the shared counters."""
+        return {
+            'name': self.name,
+            'perUser': self.per_user,
+            'total': self.total,
+            'window': self.window,
+            'allowed': self.allowed,
+            'shedLocal': self.shed_local,
+            'shedShared': self.shed_shared,
+            'shedAllInstances': memcache.get('RATE_SHED:%s' % self.name) or 0,
+        }
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""schedule.py
+
+Udacity conference server-side Python App Engine sorted interval index
+of a user's wishlisted sessions, for schedule conflict checks
+
+"""
+
+import bisect
+
+# An index is a list of [start, end, reach, websafeSessionKey] entries
+# sorted by start, with start & end in hours since 0001-01-01 and reach the
+# largest end of this & every earlier entry. reach lets the conflict scan
+# stop at the first entry before which nothing ends late enough to
+# overlap, so a check costs O(log n) plus the entries it reports; without
+# it, one long session early on would force a scan of everything since.
+
+START, END, REACH, KEY = range(4)
+
+
+def sessionInterval(session):
+    """Return (start, end) hours of a Session, or None if it has no date or startTime."""
+    if not session.date or session.startTime is None:
+        return None
+    start = session.date.toordinal() * 24 + session.startTime
+    return start, start + (session.durationHours or 0)
+
+
+def conflicts(index, start, end, hi=None):
+    """Return the keys of the indexed sessions (before index[hi], if given) overlapping [start, end).
+    Sessions without a duration take no time, so they never conflict, whether
+    new or already indexed."""
+    found = []
+    if end <= start:
+        return found
+    # entries before i start before end; walk back while one may still overlap
+    i = bisect.bisect_left(index, [end], 0, len(index) if hi is None else hi) - 1
+    while i >= 0 and index[i][REACH] > start:
+        if index[i][END] > start and index[i][END] > index[i][START]:
+            found.append(index[i][KEY])
+        i -= 1
+    return found
+
+
+def addInterval(index, start, end, key):
+    """Insert a session into the index; returns the keys it conflicts with."""
+    found = conflicts(index, start, end)
+    i = bisect.bisect_left(index, [start, end])
+    reach = max(end, index[i - 1][REACH]) if i else end
+    index.insert(i, [start, end, reach, key])
+    # reach is non decreasing, so stop at the first entry that already reaches as far
+    for entry in index[i + 1:]:
+        if entry[REACH] >= reach:
+            break
+        entry[REACH] = reach
+    return found
+
+
+def buildIndex(sessions):
+    """Return the index of the sessions that have a date and startTime."""
+    index = []
+    for session in sessions:
+        interval = session and sessionInterval(session)
+        if interval:
+            addInterval(index, interval[0], interval[1], session.key.urlsafe())
+    return index
+
+
+def allConflicts(index):
+    """Return a (key, key) pair for every two indexed sessions that overlap."""
+    pairs = []
+    for i, (start, end, reach, key) in enumerate(index):
+        for other in conflicts(index, start, end, i):
+            pairs.append((other, key))
+    return pairs
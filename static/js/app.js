@@ -130,3 +130,138 @@ app.factory('oauth2Provider', function ($modal) {
 
     return oauth2Provider;
 });
+
+
+/**
+ * @ngdoc service
+ * @name conferenceApi
+ *
+ * @description
+ * Calls the gapi.client.conference methods, sharing one request between identical calls in flight,
+ * caching the responses of read methods for a while and revalidating them with their ETag.
+ * Write methods invalidate the cached responses they change.
+ *
+ */
+app.factory('conferenceApi', function () {
+    var conferenceApi = {};
+
+    /**
+     * How long (ms) responses of the read methods are served from the cache.
+     * Methods not listed here are never cached.
+     */
+    var CACHE_TTL = {
+        getProfile: 60000,
+        getConference: 30000,
+        getConferenceBundle: 15000,
+        getConferenceSessions: 30000,
+        getAnnouncement: 60000,
+        getFeaturedSpeaker: 60000,
+        getConferencesCreated: 30000,
+        getConferencesToAttend: 30000,
+        queryConferences: 30000
+    };
+
+    /**
+     * The cached methods that accept ifNoneMatch, so an expired response can be revalidated
+     * instead of fetched again.
+     */
+    var CONDITIONAL = ['getConference', 'getConferenceSessions', 'getAnnouncement', 'getFeaturedSpeaker'];
+
+    /**
+     * The cached methods whose responses a successful write method may change.
+     */
+    var INVALIDATES = {
+        saveProfile: ['getProfile', 'getConferenceBundle'],
+        createConference: ['queryConferences', 'getConferencesCreated'],
+        registerForConference: ['getProfile', 'getConference', 'getConferenceBundle', 'getConferencesToAttend',
+            'queryConferences'],
+        unregisterFromConference: ['getProfile', 'getConference', 'getConferenceBundle', 'getConferencesToAttend',
+            'queryConferences'],
+        createSession: ['getConference', 'getConferenceBundle', 'getConferenceSessions', 'getFeaturedSpeaker']
+    };
+
+    var cache = {};
+    var inFlight = {};
+
+    var cacheKey = function (method, params) {
+        return method + ':' + JSON.stringify(params || {});
+    };
+
+    /**
+     * Calls back asynchronously, as gapi does, so callers can always use $scope.$apply.
+     */
+    var respond = function (callbacks, resp) {
+        setTimeout(function () {
+            angular.forEach(callbacks, function (callback) {
+                callback(resp);
+            });
+        }, 0);
+    };
+
+    /**
+     * Invokes gapi.client.conference[method](params) and calls back with the response.
+     *
+     * @param {string} method the conference API method name.
+     * @param {Object} params the request parameters.
+     * @param {Function} callback called with the response.
+     */
+    conferenceApi.execute = function (method, params, callback) {
+        var key = cacheKey(method, params);
+        var cached = cache[key];
+        if (cached && cached.expires > Date.now()) {
+            respond([callback], cached.resp);
+            return;
+        }
+        if (inFlight[key]) {
+            // an identical call is on its way; share its response
+            inFlight[key].push(callback);
+            return;
+        }
+        inFlight[key] = [callback];
+
+        var request = angular.extend({}, params);
+        var etag = cached && cached.resp.result && cached.resp.result.etag;
+        if (etag && CONDITIONAL.indexOf(method) >= 0) {
+            request.ifNoneMatch = etag;
+        }
+        gapi.client.conference[method](request).execute(function (resp) {
+            var callbacks = inFlight[key];
+            delete inFlight[key];
+            if (!resp.error && resp.result && resp.result.notModified && cached) {
+                // still current; serve the cached response for another TTL
+                resp = cached.resp;
+            }
+            if (!resp.error && CACHE_TTL[method]) {
+                cache[key] = {resp: resp, expires: Date.now() + CACHE_TTL[method]};
+            }
+            if (!resp.error && INVALIDATES[method]) {
+                conferenceApi.invalidate(INVALIDATES[method]);
+            }
+            angular.forEach(callbacks, function (cb) {
+                cb(resp);
+            });
+        });
+    };
+
+    /**
+     * Drops the cached responses of the given methods.
+     *
+     * @param {string[]} methods
+     */
+    conferenceApi.invalidate = function (methods) {
+        angular.forEach(Object.keys(cache), function (key) {
+            if (methods.indexOf(key.split(':')[0]) >= 0) {
+                delete cache[key];
+            }
+        });
+    };
+
+    /**
+     * Drops every cached response, e.g. when the user signs in or out.
+     */
+    conferenceApi.clear = function () {
+        cache = {};
+    };
+
+    return conferenceApi;
+});
@@ -25,7 +25,7 @@ conferenceApp.controllers = angular.module('conferenceControllers', ['ui.bootstr
  * A controller used for the My Profile page.
  */
 conferenceApp.controllers.controller('MyProfileCtrl',
-    function ($scope, $log, oauth2Provider, HTTP_ERRORS) {
+    function ($scope, $log, oauth2Provider, conferenceApi, HTTP_ERRORS) {
         $scope.submitted = false;
         $scope.loading = false;
 
@@ -63,21 +63,19 @@ conferenceApp.controllers.controller('MyProfileCtrl',
             var retrieveProfileCallback = function () {
                 $scope.profile = {};
                 $scope.loading = true;
-                gapi.client.conference.getProfile().
-                    execute(function (resp) {
-                        $scope.$apply(function () {
-                            $scope.loading = false;
-                            if (resp.error) {
-                                // Failed to get a user profile.
-                            } else {
-                                // Succeeded to get the user profile.
-                                $scope.profile.displayName = resp.result.displayName;
-                                $scope.profile.teeShirtSize = resp.result.teeShirtSize;
-                                $scope.initialProfile = resp.result;
-                            }
-                        });
-                    }
-                );
+                conferenceApi.execute('getProfile', {}, function (resp) {
+                    $scope.$apply(function () {
+                        $scope.loading = false;
+                        if (resp.error) {
+                            // Failed to get a user profile.
+                        } else {
+                            // Succeeded to get the user profile.
+                            $scope.profile.displayName = resp.result.displayName;
+                            $scope.profile.teeShirtSize = resp.result.teeShirtSize;
+                            $scope.initialProfile = resp.result;
+                        }
+                    });
+                });
             };
             if (!oauth2Provider.signedIn) {
                 var modalInstance = oauth2Provider.showLoginModal();
@@ -94,35 +92,34 @@ conferenceApp.controllers.controller('MyProfileCtrl',
         $scope.saveProfile = function () {
             $scope.submitted = true;
             $scope.loading = true;
-            gapi.client.conference.saveProfile($scope.profile).
-                execute(function (resp) {
-                    $scope.$apply(function () {
-                        $scope.loading = false;
-                        if (resp.error) {
-                            // The request has failed.
-                            var errorMessage = resp.error.message || '';
-                            $scope.messages = 'Failed to update a profile : ' + errorMessage;
-                            $scope.alertStatus = 'warning';
-                            $log.error($scope.messages + 'Profile : ' + JSON.stringify($scope.profile));
-
-                            if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
-                                oauth2Provider.showLoginModal();
-                                return;
-                            }
-                        } else {
-                            // The request has succeeded.
-                            $scope.messages = 'The profile has been updated';
-                            $scope.alertStatus = 'success';
-                            $scope.submitted = false;
-                            $scope.initialProfile = {
-                                displayName: $scope.profile.displayName,
-                                teeShirtSize: $scope.profile.teeShirtSize
-                            };
-
-                            $log.info($scope.messages + JSON.stringify(resp.result));
+            conferenceApi.execute('saveProfile', $scope.profile, function (resp) {
+                $scope.$apply(function () {
+                    $scope.loading = false;
+                    if (resp.error) {
+                        // The request has failed.
+                        var errorMessage = resp.error.message || '';
+                        $scope.messages = 'Failed to update a profile : ' + errorMessage;
+                        $scope.alertStatus = 'warning';
+                        $log.error($scope.messages + 'Profile : ' + JSON.stringify($scope.profile));
+
+                        if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
+                            oauth2Provider.showLoginModal();
+                            return;
                         }
-                    });
+                    } else {
+                        // The request has succeeded.
+                        $scope.messages = 'The profile has been updated';
+                        $scope.alertStatus = 'success';
+                        $scope.submitted = false;
+                        $scope.initialProfile = {
+                            displayName: $scope.profile.displayName,
+                            teeShirtSize: $scope.profile.teeShirtSize
+                        };
+
+                        $log.info($scope.messages + JSON.stringify(resp.result));
+                    }
                 });
+            });
         };
     })
 ;
@@ -135,7 +132,7 @@ conferenceApp.controllers.controller('MyProfileCtrl',
  * A controller used for the Create conferences page.
  */
 conferenceApp.controllers.controller('CreateConferenceCtrl',
-    function ($scope, $log, oauth2Provider, HTTP_ERRORS) {
+    function ($scope, $log, oauth2Provider, conferenceApi, HTTP_ERRORS) {
 
         /**
          * The conference object being edited in the page.
@@ -214,31 +211,30 @@ conferenceApp.controllers.controller('CreateConferenceCtrl',
             }
 
             $scope.loading = true;
-            gapi.client.conference.createConference($scope.conference).
-                execute(function (resp) {
-                    $scope.$apply(function () {
-                        $scope.loading = false;
-                        if (resp.error) {
-                            // The request has failed.
-                            var errorMessage = resp.error.message || '';
-                            $scope.messages = 'Failed to create a conference : ' + errorMessage;
-                            $scope.alertStatus = 'warning';
-                            $log.error($scope.messages + ' Conference : ' + JSON.stringify($scope.conference));
-
-                            if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
-                                oauth2Provider.showLoginModal();
-                                return;
-                            }
-                        } else {
-                            // The request has succeeded.
-                            $scope.messages = 'The conference has been created : ' + resp.result.name;
-                            $scope.alertStatus = 'success';
-                            $scope.submitted = false;
-                            $scope.conference = {};
-                            $log.info($scope.messages + ' : ' + JSON.stringify(resp.result));
+            conferenceApi.execute('createConference', $scope.conference, function (resp) {
+                $scope.$apply(function () {
+                    $scope.loading = false;
+                    if (resp.error) {
+                        // The request has failed.
+                        var errorMessage = resp.error.message || '';
+                        $scope.messages = 'Failed to create a conference : ' + errorMessage;
+                        $scope.alertStatus = 'warning';
+                        $log.error($scope.messages + ' Conference : ' + JSON.stringify($scope.conference));
+
+                        if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
+                            oauth2Provider.showLoginModal();
+                            return;
                         }
-                    });
+                    } else {
+                        // The request has succeeded.
+                        $scope.messages = 'The conference has been created : ' + resp.result.name;
+                        $scope.alertStatus = 'success';
+                        $scope.submitted = false;
+                        $scope.conference = {};
+                        $log.info($scope.messages + ' : ' + JSON.stringify(resp.result));
+                    }
                 });
+            });
         };
     });
 
@@ -249,7 +245,7 @@ conferenceApp.controllers.controller('CreateConferenceCtrl',
  * @description
  * A controller used for the Show conferences page.
  */
-conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $log, oauth2Provider, HTTP_ERRORS) {
+conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $log, oauth2Provider, conferenceApi, HTTP_ERRORS) {
 
     /**
      * Holds the status if the query is being executed.
@@ -441,31 +437,30 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
             }
         }
         $scope.loading = true;
-        gapi.client.conference.queryConferences(sendFilters).
-            execute(function (resp) {
-                $scope.$apply(function () {
-                    $scope.loading = false;
-                    if (resp.error) {
-                        // The request has failed.
-                        var errorMessage = resp.error.message || '';
-                        $scope.messages = 'Failed to query conferences : ' + errorMessage;
-                        $scope.alertStatus = 'warning';
-                        $log.error($scope.messages + ' filters : ' + JSON.stringify(sendFilters));
-                    } else {
-                        // The request has succeeded.
-                        $scope.submitted = false;
-                        $scope.messages = 'Query succeeded : ' + JSON.stringify(sendFilters);
-                        $scope.alertStatus = 'success';
-                        $log.info($scope.messages);
+        conferenceApi.execute('queryConferences', sendFilters, function (resp) {
+            $scope.$apply(function () {
+                $scope.loading = false;
+                if (resp.error) {
+                    // The request has failed.
+                    var errorMessage = resp.error.message || '';
+                    $scope.messages = 'Failed to query conferences : ' + errorMessage;
+                    $scope.alertStatus = 'warning';
+                    $log.error($scope.messages + ' filters : ' + JSON.stringify(sendFilters));
+                } else {
+                    // The request has succeeded.
+                    $scope.submitted = false;
+                    $scope.messages = 'Query succeeded : ' + JSON.stringify(sendFilters);
+                    $scope.alertStatus = 'success';
+                    $log.info($scope.messages);
 
-                        $scope.conferences = [];
-                        angular.forEach(resp.items, function (conference) {
-                            $scope.conferences.push(conference);
-                        });
-                    }
-                    $scope.submitted = true;
-                });
+                    $scope.conferences = [];
+                    angular.forEach(resp.items, function (conference) {
+                        $scope.conferences.push(conference);
+                    });
+                }
+                $scope.submitted = true;
             });
+        });
     }
 
     /**
@@ -473,36 +468,35 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.getConferencesCreated = function () {
         $scope.loading = true;
-        gapi.client.conference.getConferencesCreated().
-            execute(function (resp) {
-                $scope.$apply(function () {
-                    $scope.loading = false;
-                    if (resp.error) {
-                        // The request has failed.
-                        var errorMessage = resp.error.message || '';
-                        $scope.messages = 'Failed to query the conferences created : ' + errorMessage;
-                        $scope.alertStatus = 'warning';
-                        $log.error($scope.messages);
-
-                        if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
-                            oauth2Provider.showLoginModal();
-                            return;
-                        }
-                    } else {
-                        // The request has succeeded.
-                        $scope.submitted = false;
-                        $scope.messages = 'Query succeeded : Conferences you have created';
-                        $scope.alertStatus = 'success';
-                        $log.info($scope.messages);
+        conferenceApi.execute('getConferencesCreated', {}, function (resp) {
+            $scope.$apply(function () {
+                $scope.loading = false;
+                if (resp.error) {
+                    // The request has failed.
+                    var errorMessage = resp.error.message || '';
+                    $scope.messages = 'Failed to query the conferences created : ' + errorMessage;
+                    $scope.alertStatus = 'warning';
+                    $log.error($scope.messages);
 
-                        $scope.conferences = [];
-                        angular.forEach(resp.items, function (conference) {
-                            $scope.conferences.push(conference);
-                        });
+                    if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
+                        oauth2Provider.showLoginModal();
+                        return;
                     }
-                    $scope.submitted = true;
-                });
+                } else {
+                    // The request has succeeded.
+                    $scope.submitted = false;
+                    $scope.messages = 'Query succeeded : Conferences you have created';
+                    $scope.alertStatus = 'success';
+                    $log.info($scope.messages);
+
+                    $scope.conferences = [];
+                    angular.forEach(resp.items, function (conference) {
+                        $scope.conferences.push(conference);
+                    });
+                }
+                $scope.submitted = true;
             });
+        });
     };
 
     /**
@@ -511,31 +505,30 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
      */
     $scope.getConferencesAttend = function () {
         $scope.loading = true;
-        gapi.client.conference.getConferencesToAttend().
-            execute(function (resp) {
-                $scope.$apply(function () {
-                    if (resp.error) {
-                        // The request has failed.
-                        var errorMessage = resp.error.message || '';
-                        $scope.messages = 'Failed to query the conferences to attend : ' + errorMessage;
-                        $scope.alertStatus = 'warning';
-                        $log.error($scope.messages);
+        conferenceApi.execute('getConferencesToAttend', {}, function (resp) {
+            $scope.$apply(function () {
+                if (resp.error) {
+                    // The request has failed.
+                    var errorMessage = resp.error.message || '';
+                    $scope.messages = 'Failed to query the conferences to attend : ' + errorMessage;
+                    $scope.alertStatus = 'warning';
+                    $log.error($scope.messages);
 
-                        if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
-                            oauth2Provider.showLoginModal();
-                            return;
-                        }
-                    } else {
-                        // The request has succeeded.
-                        $scope.conferences = resp.result.items;
-                        $scope.loading = false;
-                        $scope.messages = 'Query succeeded : Conferences you will attend (or you have attended)';
-                        $scope.alertStatus = 'success';
-                        $log.info($scope.messages);
+                    if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
+                        oauth2Provider.showLoginModal();
+                        return;
                     }
-                    $scope.submitted = true;
-                });
+                } else {
+                    // The request has succeeded.
+                    $scope.conferences = resp.result.items;
+                    $scope.loading = false;
+                    $scope.messages = 'Query succeeded : Conferences you will attend (or you have attended)';
+                    $scope.alertStatus = 'success';
+                    $log.info($scope.messages);
+                }
+                $scope.submitted = true;
             });
+        });
     };
 });
 
@@ -547,21 +540,34 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
  * @description
  * A controller used for the conference detail page.
  */
-conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $log, $routeParams, HTTP_ERRORS) {
+conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $log, $routeParams, $timeout, conferenceApi, HTTP_ERRORS) {
     $scope.conference = {};
 
     $scope.isUserAttending = false;
 
+    /**
+     * The sessions of the conference.
+     * @type {Array}
+     */
+    $scope.sessions = [];
+
+    /**
+     * The featured speaker announcement, '' if there is none.
+     * @type {string}
+     */
+    $scope.featuredSpeaker = '';
+
     /**
      * Initializes the conference detail page.
-     * Invokes the conference.getConference method and sets the returned conference in the $scope.
+     * Invokes the conference.getConferenceBundle method, which returns the conference, its sessions,
+     * the featured speaker and whether the user is attending in a single request.
      *
      */
     $scope.init = function () {
         $scope.loading = true;
-        gapi.client.conference.getConference({
+        conferenceApi.execute('getConferenceBundle', {
             websafeConferenceKey: $routeParams.websafeConferenceKey
-        }).execute(function (resp) {
+        }, function (resp) {
             $scope.$apply(function () {
                 $scope.loading = false;
                 if (resp.error) {
@@ -574,27 +580,14 @@ conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $
                 } else {
                     // The request has succeeded.
                     $scope.alertStatus = 'success';
-                    $scope.conference = resp.result;
-                }
-            });
-        });
-
-        $scope.loading = true;
-        // If the user is attending the conference, updates the status message and available function.
-        gapi.client.conference.getProfile().execute(function (resp) {
-            $scope.$apply(function () {
-                $scope.loading = false;
-                if (resp.error) {
-                    // Failed to get a user profile.
-                } else {
-                    var profile = resp.result;
-                    for (var i = 0; i < profile.conferenceKeysToAttend.length; i++) {
-                        if ($routeParams.websafeConferenceKey == profile.conferenceKeysToAttend[i]) {
-                            // The user is attending the conference.
-                            $scope.alertStatus = 'info';
-                            $scope.messages = 'You are attending this conference';
-                            $scope.isUserAttending = true;
-                        }
+                    $scope.conference = resp.result.conference;
+                    $scope.sessions = resp.result.sessions || [];
+                    $scope.featuredSpeaker = resp.result.featuredSpeaker || '';
+                    if (resp.result.isAttending) {
+                        // The user is attending the conference.
+                        $scope.alertStatus = 'info';
+                        $scope.messages = 'You are attending this conference';
+                        $scope.isUserAttending = true;
                     }
                 }
             });
@@ -607,9 +600,9 @@ conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $
      */
     $scope.registerForConference = function () {
         $scope.loading = true;
-        gapi.client.conference.registerForConference({
+        conferenceApi.execute('registerForConference', {
             websafeConferenceKey: $routeParams.websafeConferenceKey
-        }).execute(function (resp) {
+        }, function (resp) {
             $scope.$apply(function () {
                 $scope.loading = false;
                 if (resp.error) {
@@ -624,7 +617,13 @@ conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $
                         return;
                     }
                 } else {
-                    if (resp.result) {
+                    if (resp.result && resp.result.ticket) {
+                        // The conference is in rush mode; the registration was queued.
+                        $scope.messages = 'You are in the queue for this conference';
+                        $scope.alertStatus = 'info';
+                        $scope.loading = true;
+                        $scope.pollRegistrationStatus(resp.result.ticket);
+                    } else if (resp.result) {
                         // Register succeeded.
                         $scope.messages = 'Registered for the conference';
                         $scope.alertStatus = 'success';
@@ -639,14 +638,50 @@ conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $
         });
     };
 
+    /**
+     * Polls the conference.getRegistrationStatus method until a queued registration is admitted or rejected.
+     *
+     * @param ticket the ticket returned by conference.registerForConference.
+     */
+    $scope.pollRegistrationStatus = function (ticket) {
+        conferenceApi.execute('getRegistrationStatus', {
+            ticket: ticket
+        }, function (resp) {
+            $scope.$apply(function () {
+                if (resp.error) {
+                    $scope.loading = false;
+                    $scope.messages = 'Failed to get the registration status : ' + (resp.error.message || '');
+                    $scope.alertStatus = 'warning';
+                    $log.error($scope.messages);
+                } else if (resp.result.status == 'QUEUED') {
+                    $timeout(function () {
+                        $scope.pollRegistrationStatus(ticket);
+                    }, 2000);
+                } else if (resp.result.status == 'ADMITTED') {
+                    conferenceApi.invalidate(['getProfile', 'getConference', 'getConferenceBundle',
+                        'getConferencesToAttend', 'queryConferences']);
+                    $scope.loading = false;
+                    $scope.messages = 'Registered for the conference';
+                    $scope.alertStatus = 'success';
+                    $scope.isUserAttending = true;
+                    $scope.conference.seatsAvailable = $scope.conference.seatsAvailable - 1;
+                } else {
+                    $scope.loading = false;
+                    $scope.messages = 'Failed to register for the conference : There are no seats available.';
+                    $scope.alertStatus = 'warning';
+                }
+            });
+        });
+    };
+
     /**
      * Invokes the conference.unregisterForConference method.
      */
     $scope.unregisterFromConference = function () {
         $scope.loading = true;
-        gapi.client.conference.unregisterFromConference({
+        conferenceApi.execute('unregisterFromConference', {
             websafeConferenceKey: $routeParams.websafeConferenceKey
-        }).execute(function (resp) {
+        }, function (resp) {
             $scope.$apply(function () {
                 $scope.loading = false;
                 if (resp.error) {
@@ -691,7 +726,7 @@ conferenceApp.controllers.controller('ConferenceDetailCtrl', function ($scope, $
  * such as user authentications.
  *
  */
-conferenceApp.controllers.controller('RootCtrl', function ($scope, $location, oauth2Provider) {
+conferenceApp.controllers.controller('RootCtrl', function ($scope, $location, oauth2Provider, conferenceApi) {
 
     /**
      * Returns if the viewLocation is the currently viewed page.
@@ -720,6 +755,8 @@ conferenceApp.controllers.controller('RootCtrl', function ($scope, $location, oa
             gapi.client.oauth2.userinfo.get().execute(function (resp) {
                 $scope.$apply(function () {
                     if (resp.email) {
+                        // drop the responses cached for the previous user
+                        conferenceApi.clear();
                         oauth2Provider.signedIn = true;
                         $scope.alertStatus = 'success';
                         $scope.rootMessages = 'Logged in with ' + resp.email;
@@ -755,6 +792,7 @@ conferenceApp.controllers.controller('RootCtrl', function ($scope, $location, oa
      */
     $scope.signOut = function () {
         oauth2Provider.signOut();
+        conferenceApi.clear();
         $scope.alertStatus = 'success';
         $scope.rootMessages = 'Logged out';
     };
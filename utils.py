@@ -3,9 +3,16 @@ import os
 import time
 import uuid
 
+from google.appengine.api import taskqueue
 from google.appengine.api import urlfetch
+from google.appengine.ext import ndb
 from models import Profile
 
+# the task queue api accepts at most this many tasks per Queue.add() call
+MAX_TASKS_PER_ADD = 100
+# and at most this many transactional tasks per transaction
+MAX_TRANSACTIONAL_TASKS = 5
+
 def getUserId(user, id_type="email"):
     if id_type == "email":
         return user.email()
@@ -43,3 +50,44 @@ def getUserId(user, id_type="email"):
             return profile.id()
         else:
             return str(uuid.uuid1().get_hex())
+
+
+class TaskBatch(object):
+    """Buffer push tasks during a request and enqueue them with as few
+    batched Queue.add() calls as possible.
+
+    Flushing inside a transaction enqueues the tasks transactionally, so
+    they only run if the datastore write commits; that is what keeps the
+    write-path tasks from running twice or for a rolled back write (named
+    tasks are not allowed in a transaction, so tasks are not named). At most
+    MAX_TRANSACTIONAL_TASKS tasks can be flushed in a transaction.
+    """
+
+    def __init__(self, queue_name='default'):
+        self.queue_name = queue_name
+        self._tasks = []
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def add(self, url, params=None, countdown=None):
+        """Buffer a task."""
+        self._tasks.append(taskqueue.Task(url=url, params=params or {}, countdown=countdown))
+
+    def flush(self, transactional=None):
+        """Enqueue all buffered tasks, returning the number added.
+        By default the tasks are transactional when called inside a transaction."""
+        if transactional is None:
+            transactional = ndb.in_transaction()
+        if not self._tasks:
+            return 0
+        if transactional and len(self._tasks) > MAX_TRANSACTIONAL_TASKS:
+            raise ValueError('at most %d tasks can be enqueued in a transaction, not %d'
+                             % (MAX_TRANSACTIONAL_TASKS, len(self._tasks)))
+
+        queue = taskqueue.Queue(self.queue_name)
+        for i in range(0, len(self._tasks), MAX_TASKS_PER_ADD):
+            queue.add(self._tasks[i:i + MAX_TASKS_PER_ADD], transactional=transactional)
+        added = len(self._tasks)
+        self._tasks = []
+        return added